@@ -1,10 +1,10 @@
 import streamlit as st
 import pandas as pd
-import time
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
-from database.crud import get_activities, get_main_activity, add_time_entry, add_activity
+from database.crud import get_activities, get_main_activity, add_activity, read_scope
 from components.timer import timer
+from components.write_status import save_time_entry, show_write_status
 from components.progress_ring import create_progress_ring
 from utils.time_helpers import format_duration, estimate_completion_date
 
@@ -34,7 +34,11 @@ def main():
         </div>
     """, unsafe_allow_html=True)
     
-    activities = get_activities()
+    show_write_status()
+    
+    with read_scope():
+        activities = get_activities()
+        main_activity = get_main_activity()
     
     if not activities:
         st.warning("⚠️ No activities found. Please add an activity to get started!")
@@ -66,8 +70,6 @@ def main():
         
         return
     
-    main_activity = get_main_activity()
-    
     if main_activity:
         col1, col2, col3 = st.columns([1, 2, 1])
         
@@ -95,42 +97,44 @@ def main():
             if timer.is_running():
                 st.markdown("---")
                 st.markdown("### ⏱️ Current Timer")
-                elapsed = timer.get_elapsed_time()
-                time_details = timer.format_time_detailed(elapsed)
-                
-                status = "⏸️ PAUSED" if st.session_state.get('is_paused', False) else "⏱️ RUNNING"
-                
-                st.markdown(f"""
-                    <div style="
-                        background: linear-gradient(135deg, rgba(34, 197, 94, 0.1) 0%, rgba(74, 222, 128, 0.1) 100%);
-                        border: 2px solid var(--primary-color);
-                        border-radius: 12px;
-                        padding: 1rem;
-                        text-align: center;
-                        margin: 1rem 0;
-                    ">
-                        <div style="font-size: 0.875rem; color: var(--text-secondary); margin-bottom: 0.5rem;">{status}</div>
-                        <div style="display: flex; justify-content: center; gap: 0.5rem; margin-bottom: 0.5rem;">
-                            <div style="text-align: center;">
-                                <div style="font-size: 1.5rem; font-weight: 700; color: var(--primary-color);">{time_details['hours']:02d}</div>
-                                <div style="font-size: 0.75rem; color: var(--text-secondary);">H</div>
-                            </div>
-                            <div style="font-size: 1.5rem; color: var(--text-secondary);">:</div>
-                            <div style="text-align: center;">
-                                <div style="font-size: 1.5rem; font-weight: 700; color: var(--primary-color);">{time_details['minutes']:02d}</div>
-                                <div style="font-size: 0.75rem; color: var(--text-secondary);">M</div>
-                            </div>
-                            <div style="font-size: 1.5rem; color: var(--text-secondary);">:</div>
-                            <div style="text-align: center;">
-                                <div style="font-size: 1.5rem; font-weight: 700; color: var(--primary-color);">{time_details['seconds']:02d}</div>
-                                <div style="font-size: 0.75rem; color: var(--text-secondary);">S</div>
+                # Only this fragment reruns each second while the timer is running
+                @st.fragment(run_every=None if st.session_state.get('is_paused', False) else 1)
+                def live_timer():
+                    elapsed = timer.get_elapsed_time()
+                    time_details = timer.format_time_detailed(elapsed)
+                    
+                    status = "⏸️ PAUSED" if st.session_state.get('is_paused', False) else "⏱️ RUNNING"
+                    
+                    st.markdown(f"""
+                        <div style="
+                            background: linear-gradient(135deg, rgba(34, 197, 94, 0.1) 0%, rgba(74, 222, 128, 0.1) 100%);
+                            border: 2px solid var(--primary-color);
+                            border-radius: 12px;
+                            padding: 1rem;
+                            text-align: center;
+                            margin: 1rem 0;
+                        ">
+                            <div style="font-size: 0.875rem; color: var(--text-secondary); margin-bottom: 0.5rem;">{status}</div>
+                            <div style="display: flex; justify-content: center; gap: 0.5rem; margin-bottom: 0.5rem;">
+                                <div style="text-align: center;">
+                                    <div style="font-size: 1.5rem; font-weight: 700; color: var(--primary-color);">{time_details['hours']:02d}</div>
+                                    <div style="font-size: 0.75rem; color: var(--text-secondary);">H</div>
+                                </div>
+                                <div style="font-size: 1.5rem; color: var(--text-secondary);">:</div>
+                                <div style="text-align: center;">
+                                    <div style="font-size: 1.5rem; font-weight: 700; color: var(--primary-color);">{time_details['minutes']:02d}</div>
+                                    <div style="font-size: 0.75rem; color: var(--text-secondary);">M</div>
+                                </div>
+                                <div style="font-size: 1.5rem; color: var(--text-secondary);">:</div>
+                                <div style="text-align: center;">
+                                    <div style="font-size: 1.5rem; font-weight: 700; color: var(--primary-color);">{time_details['seconds']:02d}</div>
+                                    <div style="font-size: 0.75rem; color: var(--text-secondary);">S</div>
+                                </div>
                             </div>
                         </div>
-                    </div>
-                """, unsafe_allow_html=True)
+                    """, unsafe_allow_html=True)
                 
-                time.sleep(1)
-                st.rerun()
+                live_timer()
         
         with col2:
             progress = (main_activity['total_hours'] / 10000) * 100
@@ -249,18 +253,19 @@ def main():
                     break
             
             if activity_id:
-                success = add_time_entry(
+                success = save_time_entry(
+                    f"{hours}h of {selected_activity}",
                     activity_id=activity_id,
                     hours=hours,
                     date=datetime.combine(date, datetime.min.time()),
                     notes=notes
                 )
                 
-                if success:
+                if success is False:
+                    st.error("❌ Failed to add time entry")
+                else:
                     st.success(f"✅ Added {hours} hours to {selected_activity}")
                     st.rerun()
-                else:
-                    st.error("❌ Failed to add time entry")
     
     st.markdown("---")
     st.subheader("📚 All Activities")
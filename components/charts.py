@@ -1,24 +1,47 @@
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import calendar
+import hashlib
+from database.query_cache import QueryCache
+from utils.downsample import lttb_indices
+from config import MILESTONE_HOURS, CHART_WEBGL_THRESHOLD
 
-def create_daily_hours_chart(df):
-    """Create a line chart showing daily hours."""
-    if df.empty:
+def reduce_points(df, x, y, max_points):
+    """Downsample a time series to at most ``max_points`` rows with LTTB."""
+    if max_points is None or len(df) <= max_points:
+        return df
+    
+    x_values = df[x].values.astype('datetime64[ns]').astype(np.int64)
+    return df.iloc[lttb_indices(x_values, df[y].to_numpy(dtype=float), max_points)]
+
+def figure_payload_size(fig):
+    """Get the size in bytes of the JSON sent to the browser for a figure."""
+    return len(fig.to_json().encode())
+
+def create_daily_hours_chart(series, max_points=None):
+    """Create a line chart showing daily hours.
+    
+    With ``max_points`` the series is downsampled to that many points and
+    drawn with WebGL once it is longer than ``CHART_WEBGL_THRESHOLD``.
+    """
+    if series.daily.empty:
         return create_empty_chart("No data available")
     
-    daily_hours = df.groupby('date')['hours'].sum().reset_index()
+    daily = reduce_points(series.daily, 'date', 'hours', max_points)
+    webgl = max_points is not None and len(daily) > CHART_WEBGL_THRESHOLD
     
     fig = px.line(
-        daily_hours, 
+        daily, 
         x='date', 
         y='hours',
         title='Daily Hours Tracked',
         labels={'hours': 'Hours', 'date': 'Date'},
-        markers=True
+        markers=not webgl,
+        render_mode='webgl' if webgl else 'auto'
     )
     
     fig.update_layout(
@@ -29,21 +52,19 @@ def create_daily_hours_chart(df):
     )
     
     fig.update_traces(
-        line=dict(color='#22C55E', width=3),
+        line=dict(color='#22C55E', width=2 if webgl else 3),
         marker=dict(color='#22C55E', size=8)
     )
     
     return fig
 
-def create_activity_breakdown_chart(df):
+def create_activity_breakdown_chart(series):
     """Create a pie chart showing activity breakdown."""
-    if df.empty:
+    if series.by_activity.empty:
         return create_empty_chart("No data available")
     
-    activity_hours = df.groupby('activity_name')['hours'].sum().reset_index()
-    
     fig = px.pie(
-        activity_hours,
+        series.by_activity,
         values='hours',
         names='activity_name',
         title='Time Distribution by Activity'
@@ -57,20 +78,13 @@ def create_activity_breakdown_chart(df):
     
     return fig
 
-def create_weekly_hours_chart(df):
+def create_weekly_hours_chart(series):
     """Create a bar chart showing weekly hours."""
-    if df.empty:
+    if series.weekly.empty:
         return create_empty_chart("No data available")
     
-    # Add week information
-    df['week'] = df['date'].dt.isocalendar().week
-    df['year'] = df['date'].dt.year
-    df['week_start'] = df['date'] - pd.to_timedelta(df['date'].dt.dayofweek, unit='d')
-    
-    weekly_hours = df.groupby('week_start')['hours'].sum().reset_index()
-    
     fig = px.bar(
-        weekly_hours,
+        series.weekly,
         x='week_start',
         y='hours',
         title='Weekly Hours Tracked',
@@ -88,62 +102,131 @@ def create_weekly_hours_chart(df):
     
     return fig
 
-def create_calendar_heatmap(df):
-    """Create a calendar heatmap showing daily activity."""
-    if df.empty:
-        return create_empty_chart("No data available")
-    
-    # Prepare data for heatmap
-    daily_hours = df.groupby('date')['hours'].sum().reset_index()
-    daily_hours['day_of_week'] = daily_hours['date'].dt.dayofweek
-    daily_hours['week_of_year'] = daily_hours['date'].dt.isocalendar().week
+# Heatmap grids of completed years, keyed by year and a hash of their data
+_year_heatmap_cache = QueryCache(32)
+
+WEEKDAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def _year_heatmap(year, day_numbers, hours):
+    """Lay out one year of daily hours on a weekday × week grid.
+    
+    Columns are weeks starting on the Monday on or before January 1st and
+    cells outside the year are NaN. Hours are scattered into the grid with a
+    single ``bincount``. Returns the grid and the date of every cell.
+    """
+    first_day = np.datetime64(f'{year}-01-01', 'D').astype(np.int64)
+    last_day = np.datetime64(f'{year + 1}-01-01', 'D').astype(np.int64)
+    # Day 0 (1970-01-01) was a Thursday, so Monday-based weekdays are (day + 3) % 7
+    grid_start = first_day - (first_day + 3) % 7
+    weeks = (last_day - 1 - grid_start) // 7 + 1
+    
+    z = np.bincount(day_numbers - grid_start, weights=hours, minlength=weeks * 7).astype(float)
+    cells = np.arange(grid_start, grid_start + weeks * 7)
+    z[(cells < first_day) | (cells >= last_day)] = np.nan
+    
+    return z.reshape(weeks, 7).T, cells.reshape(weeks, 7).T
+
+def _cached_year_heatmap(year, day_numbers, hours):
+    """Get a year's heatmap grid, reusing the grid of completed years."""
+    if year >= datetime.now().year:
+        return _year_heatmap(year, day_numbers, hours)
+    
+    key = (year, hashlib.blake2b(day_numbers.tobytes() + hours.tobytes(), digest_size=16).digest())
+    grid = _year_heatmap_cache.get(key)
+    if grid is None:
+        grid = _year_heatmap(year, day_numbers, hours)
+        _year_heatmap_cache.put(key, grid)
+    return grid
+
+def create_calendar_heatmap(series, start_date=None, end_date=None):
+    """Create a calendar heatmap showing daily activity, one row per year.
     
-    # Create matrix for heatmap
-    max_week = daily_hours['week_of_year'].max()
-    heatmap_data = np.zeros((7, max_week))
+    Days outside ``start_date``..``end_date`` (and days after today) are left
+    blank rather than shown as inactive.
+    """
+    if series.daily.empty:
+        return create_empty_chart("No data available")
     
-    for _, row in daily_hours.iterrows():
-        heatmap_data[row['day_of_week'], row['week_of_year']-1] = row['hours']
+    day_numbers = series.daily['date'].values.astype('datetime64[D]').astype(np.int64)
+    hours = series.daily['hours'].to_numpy(dtype=float)
+    years = series.daily['date'].dt.year.to_numpy()
+    
+    first_year = int(years.min()) if start_date is None else start_date.year
+    last_year = int(years.max()) if end_date is None else end_date.year
+    first_shown = -np.inf if start_date is None else np.datetime64(start_date, 'D').astype(np.int64)
+    last_shown = np.datetime64(datetime.now().date() if end_date is None else end_date, 'D').astype(np.int64)
+    
+    year_list = list(range(last_year, first_year - 1, -1))
+    fig = make_subplots(
+        rows=len(year_list),
+        cols=1,
+        subplot_titles=[str(year) for year in year_list],
+        vertical_spacing=0.25 / len(year_list)
+    )
     
-    fig = go.Figure(data=go.Heatmap(
-        z=heatmap_data,
-        colorscale='Blues',
-        showscale=True,
-        colorbar=dict(title="Hours")
-    ))
+    for row, year in enumerate(year_list, start=1):
+        # Days are sorted, so each year is a contiguous slice
+        in_year = slice(*np.searchsorted(years, [year, year + 1]))
+        z, cells = _cached_year_heatmap(year, day_numbers[in_year], hours[in_year])
+        
+        # Blank out days outside the range and drop weeks with nothing to show
+        shown = (cells >= first_shown) & (cells <= last_shown) & ~np.isnan(z)
+        weeks = shown.any(axis=0)
+        z = np.where(shown, z, np.nan)[:, weeks]
+        cells = cells[:, weeks]
+        week_starts = cells[0].astype('datetime64[D]')
+        
+        fig.add_trace(go.Heatmap(
+            z=z,
+            x=week_starts,
+            y=WEEKDAY_LABELS,
+            customdata=cells.astype('datetime64[D]').astype(str),
+            hovertemplate='%{customdata}: %{z:.1f}h<extra></extra>',
+            coloraxis='coloraxis',
+            xgap=2,
+            ygap=2
+        ), row=row, col=1)
+        fig.update_xaxes(tickformat='%b', dtick='M1', row=row, col=1)
+        fig.update_yaxes(autorange='reversed', row=row, col=1)
     
     fig.update_layout(
         title='Activity Heatmap',
-        xaxis_title='Week of Year',
-        yaxis_title='Day of Week',
-        yaxis=dict(
-            tickmode='array',
-            tickvals=[0, 1, 2, 3, 4, 5, 6],
-            ticktext=['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        ),
-        height=300,
+        coloraxis=dict(colorscale='Blues', colorbar=dict(title="Hours")),
+        height=120 + 180 * len(year_list),
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)'
     )
     
     return fig
 
-def create_progress_over_time_chart(df):
-    """Create a chart showing cumulative progress over time."""
-    if df.empty:
-        return create_empty_chart("No data available")
+def create_progress_over_time_chart(series, max_points=None):
+    """Create a chart showing cumulative progress over time.
     
-    # Calculate cumulative hours
-    df_sorted = df.sort_values('date')
-    cumulative_hours = df_sorted.groupby('date')['hours'].sum().cumsum().reset_index()
+    ``max_points`` works as in ``create_daily_hours_chart``.
+    """
+    if series.cumulative.empty:
+        return create_empty_chart("No data available")
     
-    fig = px.area(
-        cumulative_hours,
-        x='date',
-        y='hours',
-        title='Cumulative Hours Over Time',
-        labels={'hours': 'Total Hours', 'date': 'Date'}
-    )
+    cumulative = reduce_points(series.cumulative, 'date', 'hours', max_points)
+    
+    if max_points is not None and len(cumulative) > CHART_WEBGL_THRESHOLD:
+        # px.area has no WebGL mode, so fill under a WebGL line instead
+        fig = px.line(
+            cumulative,
+            x='date',
+            y='hours',
+            title='Cumulative Hours Over Time',
+            labels={'hours': 'Total Hours', 'date': 'Date'},
+            render_mode='webgl'
+        )
+    else:
+        fig = px.area(
+            cumulative,
+            x='date',
+            y='hours',
+            title='Cumulative Hours Over Time',
+            labels={'hours': 'Total Hours', 'date': 'Date'}
+        )
     
     fig.update_layout(
         height=400,
@@ -156,17 +239,13 @@ def create_progress_over_time_chart(df):
     
     return fig
 
-def create_hourly_distribution_chart(df):
+def create_hourly_distribution_chart(series):
     """Create a chart showing hour distribution throughout the day."""
-    if df.empty:
+    if series.by_hour.empty:
         return create_empty_chart("No data available")
     
-    # Extract hour from date
-    df['hour'] = df['date'].dt.hour
-    hourly_dist = df.groupby('hour')['hours'].sum().reset_index()
-    
     fig = px.bar(
-        hourly_dist,
+        series.by_hour,
         x='hour',
         y='hours',
         title='Time Distribution by Hour of Day',
@@ -213,7 +292,7 @@ def create_activity_comparison_chart(activities_data):
 
 def create_milestone_progress_chart(activity_data):
     """Create a chart showing milestone progress."""
-    milestones = [100, 500, 1000, 2500, 5000, 7500, 10000]
+    milestones = MILESTONE_HOURS
     current_hours = activity_data.get('total_hours', 0)
     
     progress = []
@@ -268,30 +347,13 @@ def create_empty_chart(message):
     
     return fig
 
-def create_streak_chart(df):
+def create_streak_chart(series):
     """Create a chart showing daily streak."""
-    if df.empty:
+    if series.streaks.empty:
         return create_empty_chart("No data available")
     
-    # Calculate streaks
-    daily_hours = df.groupby('date')['hours'].sum().reset_index()
-    daily_hours['has_activity'] = daily_hours['hours'] > 0
-    
-    # Simple streak calculation
-    streaks = []
-    current_streak = 0
-    
-    for has_activity in daily_hours['has_activity']:
-        if has_activity:
-            current_streak += 1
-        else:
-            current_streak = 0
-        streaks.append(current_streak)
-    
-    daily_hours['streak'] = streaks
-    
     fig = px.line(
-        daily_hours,
+        series.streaks,
         x='date',
         y='streak',
         title='Daily Streak',
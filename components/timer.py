@@ -1,7 +1,7 @@
 import streamlit as st
 import time
 from datetime import datetime, timedelta
-from database.crud import add_time_entry
+from components.write_status import save_time_entry
 
 class Timer:
     def __init__(self):
@@ -52,7 +52,9 @@ class Timer:
             
             hours = elapsed.total_seconds() / 3600
             
-            success = add_time_entry(
+            # Saved in the background; None means it is still being written
+            success = save_time_entry(
+                f"{hours:.2f}h from the timer",
                 activity_id=st.session_state.current_activity_id,
                 hours=hours,
                 date=datetime.now()
@@ -65,7 +67,7 @@ class Timer:
             st.session_state.paused_time = timedelta(0)
             st.session_state.is_paused = False
             
-            return hours if success else 0
+            return 0 if success is False else hours
         return 0
     
     def get_elapsed_time(self):
@@ -0,0 +1,31 @@
+import streamlit as st
+from concurrent.futures import TimeoutError
+import config
+from database.write_queue import queue_time_entry
+
+def save_time_entry(label, activity_id, hours, date=None, notes=""):
+    """Queue a time entry and give the background writer a moment to commit it.
+    
+    Returns True once the entry is committed and False if writing it failed.
+    If it is still waiting after WRITE_CONFIRM_MS the page moves on and None
+    is returned; ``show_write_status`` reports how it went on a later run.
+    ``label`` describes the entry in that report, e.g. "1.5h of Piano".
+    """
+    future = queue_time_entry(activity_id, hours, date, notes)
+    try:
+        return future.exception(timeout=config.WRITE_CONFIRM_MS / 1000) is None
+    except TimeoutError:
+        st.session_state.setdefault('pending_writes', []).append((label, future))
+        return None
+
+def show_write_status():
+    """Report time entries that were still being saved on an earlier run."""
+    pending = st.session_state.get('pending_writes', [])
+    finished = [(label, future) for label, future in pending if future.done()]
+    st.session_state.pending_writes = [item for item in pending if item not in finished]
+    
+    for label, future in finished:
+        if future.exception() is None:
+            st.toast(f"✅ Saved {label}")
+        else:
+            st.toast(f"❌ Could not save {label}: {future.exception()}")
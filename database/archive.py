@@ -0,0 +1,72 @@
+"""Move old time entries out of the hot database.
+
+Entries older than the archive horizon are copied to the archive database,
+which is attached to every connection as ``archive``, and then deleted from
+``time_entries``. Their daily rollups, totals and milestones stay in the hot
+database, so the dashboard never reads the archive; crud reads of raw entries
+only union it in when their range starts before ``archived_before``.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, exists
+import config
+from .models import TimeEntry, ArchivedTimeEntry, DatabaseState
+from .database import get_engine, reclaim_space
+from .dialects import dialect_insert
+from utils.time_helpers import start_of_day
+
+ARCHIVE_COLUMNS = ['id', 'user_id', 'activity_id', 'hours', 'date', 'notes']
+
+def archive_time_entries(after_days=None):
+    """Move entries older than ``after_days`` days to the archive.
+    
+    Copying and deleting are two transactions, each writing to one database
+    file, because SQLite does not commit attached WAL databases atomically
+    together. Copied entries are ignored by readers until the second
+    transaction deletes them and moves ``archived_before``, and copying again
+    after an interruption skips them by id. An entry is only deleted when the
+    archive holds an identical copy, so one whose id is already taken there
+    stays hot. Returns the number of entries archived.
+    """
+    after_days = config.ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    cutoff = start_of_day(datetime.now().date() - timedelta(days=after_days))
+    engine = get_engine()
+    
+    with engine.connect() as connection:
+        archived_before = connection.execute(
+            select(DatabaseState.archived_before).where(DatabaseState.id == 1)
+        ).scalar()
+    
+    expired = TimeEntry.date < cutoff
+    # Both tables are called time_entries, so name the archive apart
+    archived_entries = ArchivedTimeEntry.__table__.alias('archived_entries')
+    # Notes may be NULL, so compare the columns null-safely
+    copied = exists().where(archived_entries.c.id == TimeEntry.id, *[
+        archived_entries.c[name].is_not_distinct_from(TimeEntry.__table__.c[name])
+        for name in ARCHIVE_COLUMNS[1:]
+    ])
+    
+    with engine.begin() as connection:
+        connection.execute(
+            dialect_insert(connection, ArchivedTimeEntry).from_select(
+                ARCHIVE_COLUMNS,
+                select(*[TimeEntry.__table__.c[name] for name in ARCHIVE_COLUMNS]).where(expired)
+            ).on_conflict_do_nothing(index_elements=[ArchivedTimeEntry.id])
+        )
+    
+    with engine.begin() as connection:
+        archived = connection.execute(
+            delete(TimeEntry).where(expired, copied)
+        ).rowcount
+        # Never move the boundary back: a shorter horizon keeps what is archived
+        connection.execute(
+            DatabaseState.__table__.update()
+            .where(DatabaseState.id == 1)
+            .values(
+                archived_before=max(cutoff, archived_before or cutoff),
+                write_generation=DatabaseState.write_generation + 1
+            )
+        )
+    
+    if archived:
+        reclaim_space()
+    return archived
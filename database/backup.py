@@ -0,0 +1,118 @@
+"""Online database snapshots built on the SQLite backup API.
+
+Snapshots are copied through a regular connection, so they include everything
+committed to the WAL and never capture a half-written page. Archived time
+entries are folded back into the snapshot, so it holds the full history on
+its own. Snapshots are written to a rotating backups directory, optionally
+gzipped.
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import config
+from .database import get_engine, database_path, archive_path, is_sqlite
+from .users import current_user_id, user_slug
+
+BACKUP_PREFIX = 'tracker_backup_'
+
+def default_backup_dir():
+    """Get the backups directory of the current database.
+    
+    With one database per user, each user's snapshots go to a subdirectory.
+    """
+    if config.DB_PER_USER:
+        return os.path.join(config.BACKUP_DIR, user_slug(current_user_id()))
+    return config.BACKUP_DIR
+
+def list_backups(backup_dir=None):
+    """Get the paths of all snapshots, newest first."""
+    backup_dir = backup_dir or default_backup_dir()
+    paths = glob.glob(os.path.join(backup_dir, f'{BACKUP_PREFIX}*.db')) + \
+        glob.glob(os.path.join(backup_dir, f'{BACKUP_PREFIX}*.db.gz'))
+    # Names embed the creation time, so they sort chronologically
+    return sorted(paths, key=os.path.basename, reverse=True)
+
+def latest_backup(backup_dir=None):
+    """Get the path of the newest snapshot, or None."""
+    backups = list_backups(backup_dir)
+    return backups[0] if backups else None
+
+def _rotate(backup_dir, keep):
+    """Delete all but the newest ``keep`` snapshots."""
+    for path in list_backups(backup_dir)[keep:]:
+        os.remove(path)
+
+def _include_archive(path):
+    """Copy the archived entries into a snapshot and mark it as unarchived.
+    
+    Only entries before the snapshot's own ``archived_before`` are copied, so
+    entries archived after the snapshot was taken are not added twice.
+    """
+    with closing(sqlite3.connect(path)) as snapshot:
+        row = snapshot.execute("SELECT archived_before FROM database_state WHERE id = 1").fetchone()
+        if not row or row[0] is None:
+            return
+        
+        snapshot.execute("ATTACH DATABASE ? AS archive", (archive_path(database_path()),))
+        snapshot.execute(
+            "INSERT OR IGNORE INTO time_entries (id, user_id, activity_id, hours, date, notes)"
+            " SELECT id, user_id, activity_id, hours, date, notes FROM archive.time_entries WHERE date < ?",
+            row
+        )
+        snapshot.execute("UPDATE database_state SET archived_before = NULL WHERE id = 1")
+        snapshot.commit()
+        snapshot.execute("DETACH DATABASE archive")
+
+def create_backup(backup_dir=None, compress=None, keep=None, pages=None):
+    """Write a consistent snapshot of the database and return its path.
+    
+    The snapshot is copied into a temporary file in ``backup_dir`` (``pages``
+    pages per step unless the database is in WAL mode), gzipped if
+    ``compress``, and only then given its final name, so a half-written
+    snapshot is never picked up. Afterwards only the newest ``keep``
+    snapshots are kept. Defaults come from ``config``. Only SQLite databases
+    can be snapshotted; back up a PostgreSQL server with its own tools.
+    """
+    if not is_sqlite():
+        raise RuntimeError("Snapshots need a SQLite database; back up PostgreSQL with pg_dump")
+    
+    backup_dir = backup_dir or default_backup_dir()
+    compress = config.BACKUP_COMPRESS if compress is None else compress
+    keep = config.BACKUP_KEEP if keep is None else keep
+    pages = pages or config.BACKUP_PAGES_PER_STEP
+    
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db")
+    partial = path + '.partial'
+    
+    try:
+        with closing(sqlite3.connect(partial)) as target:
+            with closing(get_engine().raw_connection()) as source:
+                connection = source.driver_connection
+                journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+                # In WAL mode the copy reads one snapshot without blocking
+                # writers, and stepping would only restart it after every
+                # concurrent commit. Other modes lock writers out for each
+                # step, so copy a few pages at a time and let them in between.
+                connection.backup(target, pages=-1 if journal_mode == 'wal' else pages, sleep=0.005)
+        _include_archive(partial)
+        
+        if compress:
+            with open(partial, 'rb') as raw, gzip.open(partial + '.gz', 'wb', compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, length=1024 * 1024)
+            os.remove(partial)
+            partial, path = partial + '.gz', path + '.gz'
+        
+        os.replace(partial, path)
+    except Exception:
+        for leftover in (partial, partial + '.gz'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    
+    _rotate(backup_dir, keep)
+    return path
@@ -1,147 +1,243 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from .models import Activity, TimeEntry, Milestone
-from .database import SessionLocal
+from sqlalchemy import func, case, cast, extract, select, insert, delete, literal, union_all, type_coerce, Integer, String, DateTime
+from .models import Activity, TimeEntry, ArchivedTimeEntry, Milestone, DailyRollup, ActivityTotals, DatabaseState, UserState
+from .database import SessionLocal, DERIVED_TABLES, get_engine
+from .dialects import day_of, week_start, month_start, least, greatest, dialect_insert
+from .users import current_user_id
+from .query_cache import QueryCache
+from utils.streaks import compute_streaks
+from utils.series import build_series
+from utils.time_helpers import start_of_day
+from config import MILESTONE_HOURS, QUERY_CACHE_SIZE, DELETE_BATCH_SIZE
 from datetime import datetime, timedelta
+from dateutil.tz import tzlocal
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import deepcopy
+from functools import wraps
+import numpy as np
 import pandas as pd
 
 def get_db_session():
-    """Get a database session."""
-    return SessionLocal()
+    """Get a database session for the current user's database."""
+    return SessionLocal(bind=get_engine())
 
-def get_activities():
-    """Get all activities with their statistics."""
+# Per-run read scope: one session and one snapshot shared by crud reads
+_current_read_scope = ContextVar('current_read_scope', default=None)
+
+@contextmanager
+def read_scope():
+    """Share one connection and read transaction between crud reads.
+    
+    Wrap the data-loading part of a page run in ``with read_scope():`` so that
+    every read inside it runs on the same connection against one consistent
+    snapshot, and the write generation is looked up only once. Nested scopes
+    reuse the outer one.
+    """
+    if _current_read_scope.get() is not None:
+        yield
+        return
+    
     db = get_db_session()
+    # pysqlite only opens transactions before writes, so start the read
+    # transaction explicitly; elsewhere ask for one snapshot for the whole
+    # transaction. Closing the session rolls it back.
+    if db.get_bind().dialect.name == 'sqlite':
+        db.connection().exec_driver_sql("BEGIN")
+    else:
+        db.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    token = _current_read_scope.set({'db': db, 'generation': None})
     try:
-        activities = db.query(Activity).all()
-        activity_stats = []
-        
-        for activity in activities:
-            # Calculate total hours
-            total_hours = db.query(func.sum(TimeEntry.hours)).filter(
-                TimeEntry.activity_id == activity.id
-            ).scalar() or 0
-            
-            # Calculate today's hours
-            today = datetime.now().date()
-            today_hours = db.query(func.sum(TimeEntry.hours)).filter(
-                TimeEntry.activity_id == activity.id,
-                func.date(TimeEntry.date) == today
-            ).scalar() or 0
-            
-            # Calculate week's hours
-            week_start = today - timedelta(days=today.weekday())
-            week_hours = db.query(func.sum(TimeEntry.hours)).filter(
-                TimeEntry.activity_id == activity.id,
-                func.date(TimeEntry.date) >= week_start
-            ).scalar() or 0
-            
-            # Calculate daily average
-            first_entry = db.query(func.min(TimeEntry.date)).filter(
-                TimeEntry.activity_id == activity.id
-            ).scalar()
-            
-            if first_entry:
-                days_active = (datetime.now() - first_entry).days + 1
-                daily_avg = total_hours / days_active if days_active > 0 else 0
-            else:
-                daily_avg = 0
-            
-            # Calculate session count
-            session_count = db.query(TimeEntry).filter(
-                TimeEntry.activity_id == activity.id
-            ).count()
-            
-            # Calculate streak (simplified)
-            streak = 0
-            current_date = datetime.now().date()
-            while True:
-                has_entry = db.query(TimeEntry).filter(
-                    TimeEntry.activity_id == activity.id,
-                    func.date(TimeEntry.date) == current_date
-                ).first()
-                if has_entry:
-                    streak += 1
-                    current_date -= timedelta(days=1)
-                else:
-                    break
-            
-            activity_stats.append({
-                'id': activity.id,
-                'name': activity.name,
-                'description': activity.description,
-                'category': activity.category,
-                'is_main': activity.is_main,
-                'color': activity.color,
-                'total_hours': total_hours,
-                'today_hours': today_hours,
-                'week_hours': week_hours,
-                'daily_avg': daily_avg,
-                'session_count': session_count,
-                'streak': streak
-            })
-        
-        return activity_stats
+        yield
     finally:
+        _current_read_scope.reset(token)
         db.close()
 
-def get_main_activity():
-    """Get the main activity with its statistics."""
+@contextmanager
+def _read_session():
+    """Get the session of the active read scope, or a short-lived one."""
+    scope = _current_read_scope.get()
+    if scope is not None:
+        yield scope['db']
+        return
+    
     db = get_db_session()
     try:
-        main_activity = db.query(Activity).filter(Activity.is_main == True).first()
-        if not main_activity:
-            return None
-        
-        # Calculate statistics
-        total_hours = db.query(func.sum(TimeEntry.hours)).filter(
-            TimeEntry.activity_id == main_activity.id
-        ).scalar() or 0
-        
-        today = datetime.now().date()
-        today_hours = db.query(func.sum(TimeEntry.hours)).filter(
-            TimeEntry.activity_id == main_activity.id,
-            func.date(TimeEntry.date) == today
-        ).scalar() or 0
-        
-        week_start = today - timedelta(days=today.weekday())
-        week_hours = db.query(func.sum(TimeEntry.hours)).filter(
-            TimeEntry.activity_id == main_activity.id,
-            func.date(TimeEntry.date) >= week_start
-        ).scalar() or 0
-        
-        # Calculate daily average
-        first_entry = db.query(func.min(TimeEntry.date)).filter(
-            TimeEntry.activity_id == main_activity.id
-        ).scalar()
-        
-        if first_entry:
-            days_active = (datetime.now() - first_entry).days + 1
-            daily_avg = total_hours / days_active if days_active > 0 else 0
-        else:
-            daily_avg = 0
-        
-        return {
-            'id': main_activity.id,
-            'name': main_activity.name,
-            'description': main_activity.description,
-            'total_hours': total_hours,
-            'today_hours': today_hours,
-            'week_hours': week_hours,
-            'daily_avg': daily_avg
-        }
+        yield db
     finally:
         db.close()
 
+# Read results keyed by the write generation they were computed at
+_query_cache = QueryCache(QUERY_CACHE_SIZE)
+_MISSING = object()
+
+def _bump_write_generation(db):
+    """Mark the current user's data as changed; call inside every write transaction."""
+    statement = dialect_insert(db, UserState).values(user_id=current_user_id(), write_generation=1)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[UserState.user_id],
+        set_={'write_generation': UserState.write_generation + 1}
+    ))
+
+def _write_generation(db):
+    """Get the database-wide and the current user's write generation.
+    
+    Maintenance jobs bump the database-wide one, crud writes only the user's,
+    so one user's writes never invalidate another user's cached reads.
+    """
+    user_generation = select(UserState.write_generation).where(
+        UserState.user_id == current_user_id()
+    ).scalar_subquery()
+    return tuple(db.execute(
+        select(DatabaseState.write_generation, user_generation).where(DatabaseState.id == 1)
+    ).one())
+
+def _current_write_generation():
+    """Get the write generation, once per read scope."""
+    scope = _current_read_scope.get()
+    if scope is None:
+        with _read_session() as db:
+            return _write_generation(db)
+    
+    if scope['generation'] is None:
+        scope['generation'] = _write_generation(scope['db'])
+    return scope['generation']
+
+def _cached(func):
+    """Answer repeated reads from the query cache until the next write.
+    
+    Every write bumps the write generation stored in the database, so results
+    cached under an older generation are never served again, even when the
+    write came from another process. The user and the date are part of the
+    key because results depend on them (today's hours, streaks). Callers get a copy, so
+    modifying a returned DataFrame or dict does not leak into later calls.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (
+            func.__name__, repr(args), repr(sorted(kwargs.items())),
+            current_user_id(), _current_write_generation(), datetime.now().date()
+        )
+        result = _query_cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = func(*args, **kwargs)
+            _query_cache.put(key, result)
+        return deepcopy(result)
+    return wrapper
+
+def _activity_stats_query(db):
+    """Build a query returning every activity with its aggregated statistics.
+
+    Lifetime totals are read from ``activity_totals`` and today's and this
+    week's hours from ``daily_rollups``, so the result is produced in one
+    round trip without scanning ``time_entries``.
+    """
+    today = datetime.now().date()
+    week_start = today - timedelta(days=today.weekday())
+    user_id = current_user_id()
+    
+    recent = db.query(
+        DailyRollup.activity_id.label('activity_id'),
+        func.sum(case((DailyRollup.day == today, DailyRollup.hours), else_=0)).label('today_hours'),
+        func.sum(DailyRollup.hours).label('week_hours')
+    ).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day >= week_start
+    ).group_by(DailyRollup.activity_id).subquery()
+    
+    return db.query(
+        Activity,
+        ActivityTotals.total_hours,
+        ActivityTotals.session_count,
+        ActivityTotals.first_entry,
+        recent.c.today_hours,
+        recent.c.week_hours
+    ).outerjoin(
+        ActivityTotals, ActivityTotals.activity_id == Activity.id
+    ).outerjoin(
+        recent, recent.c.activity_id == Activity.id
+    ).filter(
+        Activity.user_id == user_id
+    ).order_by(Activity.id)
+
+def _get_streaks(db, activity_id=None):
+    """Get current and longest streaks keyed by activity id.
+
+    Reads the active days of all (or one) activities from ``daily_rollups``
+    in a single query and hands them to the shared streak engine.
+    """
+    query = db.query(DailyRollup.activity_id, DailyRollup.day).filter(DailyRollup.user_id == current_user_id())
+    if activity_id is not None:
+        query = query.filter(DailyRollup.activity_id == activity_id)
+    rows = query.all()
+    
+    if not rows:
+        return {}
+    activity_ids, days = zip(*rows)
+    return compute_streaks(activity_ids, days)
+
+def _activity_stats_to_dict(row, streaks):
+    """Convert a row from ``_activity_stats_query`` into a statistics dict."""
+    activity = row[0]
+    total_hours = row.total_hours or 0
+    streak = streaks.get(activity.id, {'current': 0, 'longest': 0})
+    
+    # Calculate daily average
+    if row.first_entry:
+        days_active = (datetime.now() - row.first_entry).days + 1
+        daily_avg = total_hours / days_active if days_active > 0 else 0
+    else:
+        daily_avg = 0
+    
+    return {
+        'id': activity.id,
+        'name': activity.name,
+        'description': activity.description,
+        'category': activity.category,
+        'is_main': activity.is_main,
+        'color': activity.color,
+        'total_hours': total_hours,
+        'today_hours': row.today_hours or 0,
+        'week_hours': row.week_hours or 0,
+        'daily_avg': daily_avg,
+        'session_count': row.session_count or 0,
+        'streak': streak['current'],
+        'longest_streak': streak['longest']
+    }
+
+@_cached
+def get_activities():
+    """Get all activities with their statistics."""
+    with _read_session() as db:
+        rows = _activity_stats_query(db).all()
+        streaks = _get_streaks(db)
+        return [_activity_stats_to_dict(row, streaks) for row in rows]
+
+@_cached
+def get_main_activity():
+    """Get the main activity with its statistics."""
+    if _current_read_scope.get() is not None:
+        # Reuse the statistics already computed for all activities in this run
+        return next((activity for activity in get_activities() if activity['is_main']), None)
+    
+    with _read_session() as db:
+        row = _activity_stats_query(db).filter(Activity.is_main == True).first()
+        if not row:
+            return None
+        return _activity_stats_to_dict(row, _get_streaks(db, row[0].id))
+
 def add_activity(name, description="", category="", is_main=False, color="#3B82F6"):
     """Add a new activity."""
     db = get_db_session()
     try:
         # If setting as main, unset other main activities
         if is_main:
-            db.query(Activity).filter(Activity.is_main == True).update({Activity.is_main: False})
+            db.query(Activity).filter(
+                Activity.user_id == current_user_id(), Activity.is_main == True
+            ).update({Activity.is_main: False})
         
         activity = Activity(
+            user_id=current_user_id(),
             name=name,
             description=description,
             category=category,
@@ -149,16 +245,58 @@ def add_activity(name, description="", category="", is_main=False, color="#3B82F
             color=color
         )
         db.add(activity)
+        _bump_write_generation(db)
         db.commit()
         return activity.id
     finally:
         db.close()
 
+def get_or_create_activities(activities):
+    """Get activity ids by name, adding the activities that don't exist yet.
+    
+    ``activities`` is a DataFrame with a ``name`` column and optional
+    ``category`` and ``description`` columns, used for new activities.
+    Returns a dict mapping every name to its activity id.
+    """
+    activities = activities.drop_duplicates('name')
+    user_id = current_user_id()
+    db = get_db_session()
+    try:
+        ids = {}
+        user_activities = db.query(Activity.id, Activity.name).filter(Activity.user_id == user_id)
+        for activity_id, name in user_activities.order_by(Activity.id.desc()):
+            ids[name] = activity_id
+        
+        missing = activities[~activities['name'].isin(list(ids))]
+        if not missing.empty:
+            db.execute(insert(Activity), [
+                {
+                    'user_id': user_id,
+                    'name': row['name'],
+                    'category': row.get('category') or '',
+                    'description': row.get('description') or '',
+                    'is_main': False
+                }
+                for row in missing.to_dict('records')
+            ])
+            for activity_id, name in user_activities.filter(
+                Activity.name.in_(missing['name'].tolist())
+            ).order_by(Activity.id.desc()):
+                ids[name] = activity_id
+            _bump_write_generation(db)
+            db.commit()
+        
+        return {name: ids[name] for name in activities['name']}
+    finally:
+        db.close()
+
 def update_activity(activity_id, name=None, description=None, category=None, is_main=None, color=None):
     """Update an existing activity."""
     db = get_db_session()
     try:
-        activity = db.query(Activity).filter(Activity.id == activity_id).first()
+        activity = db.query(Activity).filter(
+            Activity.user_id == current_user_id(), Activity.id == activity_id
+        ).first()
         if not activity:
             return False
         
@@ -173,9 +311,12 @@ def update_activity(activity_id, name=None, description=None, category=None, is_
         if is_main is not None:
             if is_main:
                 # Unset other main activities
-                db.query(Activity).filter(Activity.is_main == True).update({Activity.is_main: False})
+                db.query(Activity).filter(
+                    Activity.user_id == current_user_id(), Activity.is_main == True
+                ).update({Activity.is_main: False})
             activity.is_main = is_main
         
+        _bump_write_generation(db)
         db.commit()
         return True
     finally:
@@ -183,106 +324,599 @@ def update_activity(activity_id, name=None, description=None, category=None, is_
 
 def delete_activity(activity_id):
     """Delete an activity and all its time entries."""
+    user_id = current_user_id()
     db = get_db_session()
     try:
+        if not db.query(Activity.id).filter(Activity.user_id == user_id, Activity.id == activity_id).first():
+            return False
+        
         # Delete time entries first
-        db.query(TimeEntry).filter(TimeEntry.activity_id == activity_id).delete()
-        # Delete milestones
-        db.query(Milestone).filter(Milestone.activity_id == activity_id).delete()
+        db.query(TimeEntry).filter(TimeEntry.user_id == user_id, TimeEntry.activity_id == activity_id).delete()
+        db.query(ArchivedTimeEntry).filter(
+            ArchivedTimeEntry.user_id == user_id, ArchivedTimeEntry.activity_id == activity_id
+        ).delete()
+        # Delete milestones and derived statistics
+        db.query(Milestone).filter(Milestone.user_id == user_id, Milestone.activity_id == activity_id).delete()
+        db.query(DailyRollup).filter(DailyRollup.activity_id == activity_id).delete()
+        db.query(ActivityTotals).filter(ActivityTotals.activity_id == activity_id).delete()
         # Delete activity
         db.query(Activity).filter(Activity.id == activity_id).delete()
+        _bump_write_generation(db)
         db.commit()
         return True
     finally:
         db.close()
 
-def add_time_entry(activity_id, hours, date=None, notes=""):
-    """Add a time entry for an activity."""
+def _delete_in_batches(db, entries, condition, batch_size):
+    """Delete the matching rows of an entries table oldest first, ``batch_size`` at a time.
+    
+    Every full batch is committed; the last, partial one is left in the open
+    transaction. Returns the number of rows deleted.
+    """
+    batch = select(entries.c.id).where(condition).order_by(entries.c.id).limit(batch_size)
+    deleted = 0
+    while True:
+        count = db.execute(delete(entries).where(entries.c.id.in_(batch.scalar_subquery()))).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+        db.commit()
+
+def _clear_data(delete_activities, batch_size):
+    """Delete every time entry of the current user, and optionally every activity.
+    
+    Archived and then hot entries are deleted oldest first in transactions of
+    ``batch_size`` rows, so writers are never locked out for long; the archive
+    is committed on its own, as it lives in its own file on SQLite. Until the
+    last batch the derived tables and the write generation are left alone, so
+    cached reads keep showing the old data. The last batch clears milestones
+    and rebuilds the derived tables in the same transaction. Entries logged
+    while the clear was running are kept. Callers reclaim the freed space
+    afterwards with ``database.reclaim_space``, so a failure there is not
+    mistaken for a failed delete. Returns the number of entries deleted.
+    """
+    user_id = current_user_id()
     db = get_db_session()
     try:
-        if date is None:
-            date = datetime.now()
-        
-        entry = TimeEntry(
-            activity_id=activity_id,
-            hours=hours,
-            date=date,
-            notes=notes
+        deleted = _delete_in_batches(
+            db, ArchivedTimeEntry.__table__, ArchivedTimeEntry.user_id == user_id, batch_size
         )
-        db.add(entry)
         db.commit()
         
-        # Check for milestones
-        total_hours = db.query(func.sum(TimeEntry.hours)).filter(
-            TimeEntry.activity_id == activity_id
-        ).scalar() or 0
+        last_id = db.execute(select(func.max(TimeEntry.id)).where(TimeEntry.user_id == user_id)).scalar() or 0
+        deleted += _delete_in_batches(
+            db, TimeEntry.__table__, (TimeEntry.user_id == user_id) & (TimeEntry.id <= last_id), batch_size
+        )
         
-        milestones = [100, 500, 1000, 2500, 5000, 7500, 10000]
-        for milestone in milestones:
-            if total_hours >= milestone:
-                # Check if milestone already exists
-                existing = db.query(Milestone).filter(
-                    Milestone.activity_id == activity_id,
-                    Milestone.hours_reached == milestone
-                ).first()
-                if not existing:
-                    milestone_entry = Milestone(
-                        activity_id=activity_id,
-                        hours_reached=milestone
-                    )
-                    db.add(milestone_entry)
+        db.execute(delete(Milestone).where(Milestone.user_id == user_id))
+        if delete_activities:
+            deleted += db.execute(delete(TimeEntry).where(TimeEntry.user_id == user_id)).rowcount
+            db.execute(delete(Activity).where(Activity.user_id == user_id))
+        
+        connection = db.connection()
+        for rebuild in DERIVED_TABLES.values():
+            rebuild(connection, user_id)
+        _record_milestones(db, select(ActivityTotals.activity_id).where(ActivityTotals.user_id == user_id))
+        _bump_write_generation(db)
+        db.commit()
+    finally:
+        db.close()
+    
+    return deleted
+
+def clear_time_entries(batch_size=DELETE_BATCH_SIZE):
+    """Delete all time entries and milestones, keeping the activities."""
+    return _clear_data(False, batch_size)
+
+def reset_all_data(batch_size=DELETE_BATCH_SIZE):
+    """Delete all activities, time entries and milestones."""
+    return _clear_data(True, batch_size)
+
+def _update_daily_rollups(db, rows):
+    """Add changes in hours and session counts to daily rollups.
+    
+    ``rows`` are dicts with ``activity_id``, ``day``, ``user_id``, ``hours``
+    and ``sessions``; they are applied with a single executemany upsert. Must be
+    called in the same transaction as the change to ``time_entries``.
+    """
+    statement = dialect_insert(db, DailyRollup)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[DailyRollup.activity_id, DailyRollup.day],
+        set_={
+            'hours': DailyRollup.hours + statement.excluded.hours,
+            'sessions': DailyRollup.sessions + statement.excluded.sessions
+        }
+    ), rows)
+
+def _update_activity_totals(db, rows):
+    """Add changes in hours and session counts to activities' running totals.
+    
+    ``rows`` are dicts with ``activity_id``, ``user_id``, ``total_hours``,
+    ``session_count``, ``first_entry`` and ``last_entry``; they are applied
+    with a single executemany upsert. Must be called in the same transaction
+    as the change to ``time_entries``.
+    """
+    statement = dialect_insert(db, ActivityTotals)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[ActivityTotals.activity_id],
+        set_={
+            'total_hours': ActivityTotals.total_hours + statement.excluded.total_hours,
+            'session_count': ActivityTotals.session_count + statement.excluded.session_count,
+            'first_entry': least(ActivityTotals.first_entry, statement.excluded.first_entry),
+            'last_entry': greatest(ActivityTotals.last_entry, statement.excluded.last_entry)
+        }
+    ), rows)
+
+def _record_entry_change(db, activity_id, date, hours):
+    """Add a new entry to every derived table."""
+    day = date.date() if isinstance(date, datetime) else date
+    user_id = current_user_id()
+    _update_daily_rollups(db, [{
+        'activity_id': activity_id,
+        'day': day,
+        'user_id': user_id,
+        'hours': hours,
+        'sessions': 1
+    }])
+    _update_activity_totals(db, [{
+        'activity_id': activity_id,
+        'user_id': user_id,
+        'total_hours': hours,
+        'session_count': 1,
+        'first_entry': date,
+        'last_entry': date
+    }])
+
+def _record_milestones(db, activity_ids):
+    """Insert every milestone the given activities have newly crossed.
+    
+    A single INSERT ... SELECT compares the configured thresholds with the
+    running totals in ``activity_totals``; thresholds that were already
+    recorded are skipped by the unique (user_id, activity_id, hours_reached)
+    index.
+    """
+    thresholds = union_all(*[
+        select(literal(hours, Integer).label('hours')) for hours in MILESTONE_HOURS
+    ]).subquery('thresholds')
+    
+    statement = dialect_insert(db, Milestone).from_select(
+        ['user_id', 'activity_id', 'hours_reached', 'reached_at'],
+        select(
+            ActivityTotals.user_id,
+            ActivityTotals.activity_id,
+            thresholds.c.hours,
+            literal(datetime.now(), DateTime)
+        ).where(
+            ActivityTotals.activity_id.in_(activity_ids),
+            thresholds.c.hours <= ActivityTotals.total_hours
+        )
+    )
+    db.execute(statement.on_conflict_do_nothing(
+        index_elements=[Milestone.user_id, Milestone.activity_id, Milestone.hours_reached]
+    ))
+
+def add_time_entry(activity_id, hours, date=None, notes=""):
+    """Add a time entry for an activity."""
+    return add_time_entries([{'activity_id': activity_id, 'hours': hours, 'date': date, 'notes': notes}])
+
+def add_time_entries(entries):
+    """Add several time entries in one transaction.
+    
+    ``entries`` are dicts with the arguments of ``add_time_entry``. The
+    background writer uses this to commit entries logged at the same time
+    together (see ``database.write_queue``). Raises ValueError, writing
+    nothing, if an entry's activity is not the current user's.
+    """
+    db = get_db_session()
+    try:
+        unknown = {entry['activity_id'] for entry in entries} - set(_user_activity_ids(db))
+        if unknown:
+            raise ValueError(f"Unknown activity: {', '.join(map(str, sorted(unknown, key=str)))}")
         
+        for entry in entries:
+            date = entry.get('date') or datetime.now()
+            db.add(TimeEntry(
+                user_id=current_user_id(),
+                activity_id=entry['activity_id'],
+                hours=entry['hours'],
+                date=date,
+                notes=entry.get('notes', "")
+            ))
+            _record_entry_change(db, entry['activity_id'], date, entry['hours'])
+        _record_milestones(db, list({entry['activity_id'] for entry in entries}))
+        _bump_write_generation(db)
         db.commit()
         return True
     finally:
         db.close()
 
-def get_time_entries_df(start_date=None, end_date=None):
-    """Get time entries as a pandas DataFrame."""
+def _user_activity_ids(db):
+    """Get the ids of the current user's activities."""
+    return [activity_id for (activity_id,) in db.query(Activity.id).filter(Activity.user_id == current_user_id())]
+
+# A time of day followed by a UTC offset, e.g. "10:30:00+02:00" or "10:30Z"
+_UTC_OFFSET = r'\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:Z|[+-]\d{2}:?\d{2})$'
+
+def _parse_entry_dates(values):
+    """Parse entry dates into naive local times.
+    
+    Times with a UTC offset are converted to local time, so files that mix
+    offsets, or mix them with naive times, parse instead of raising.
+    Unparseable values become NaT.
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values.dt.tz_convert(tzlocal()).dt.tz_localize(None)
+    if pd.api.types.is_datetime64_dtype(values):
+        return values
+    
+    aware = values.astype(str).str.contains(_UTC_OFFSET, regex=True)
+    naive = pd.to_datetime(values[~aware], errors='coerce', format='mixed')
+    local = pd.to_datetime(values[aware], errors='coerce', format='mixed', utc=True)
+    local = local.dt.tz_convert(tzlocal()).dt.tz_localize(None)
+    return pd.concat([naive, local]).reindex(values.index)
+
+def validate_time_entries(df, activity_ids=None):
+    """Split entries into valid rows and rejected rows with a reason.
+    
+    Entries must belong to one of ``activity_ids``, by default the current
+    user's activities. All checks are vectorized; the valid rows come back
+    with typed ``activity_id``, ``hours``, ``date`` and ``notes`` columns and
+    can be passed to ``add_time_entries_bulk`` with ``validated=True``.
+    """
+    if activity_ids is None:
+        with _read_session() as db:
+            activity_ids = _user_activity_ids(db)
+    activity_id = pd.to_numeric(df['activity_id'], errors='coerce')
+    hours = pd.to_numeric(df['hours'], errors='coerce')
+    if 'date' in df:
+        date = _parse_entry_dates(df['date'])
+    else:
+        date = pd.Series(pd.Timestamp(datetime.now()), index=df.index)
+    notes = df['notes'].fillna('').astype(str) if 'notes' in df else pd.Series('', index=df.index)
+    
+    reason = pd.Series(np.select(
+        [
+            ~activity_id.isin(activity_ids),
+            hours.isna() | (hours <= 0) | (hours > 24),
+            date.isna()
+        ],
+        [
+            'unknown activity',
+            'hours must be more than 0 and at most 24',
+            'invalid date'
+        ],
+        default=''
+    ), index=df.index)
+    
+    valid = reason == ''
+    entries = pd.DataFrame({
+        'activity_id': activity_id[valid].astype(int),
+        'hours': hours[valid].astype(float),
+        'date': date[valid],
+        'notes': notes[valid]
+    })
+    rejected = df[~valid].assign(reason=reason[~valid])
+    return entries, rejected
+
+def add_time_entries_bulk(entries, batch_size=5000, validated=False):
+    """Validate and add many time entries in a single transaction.
+    
+    ``entries`` is a DataFrame or an iterable of dicts with ``activity_id``,
+    ``hours``, ``date`` and optional ``notes``; with ``validated`` it is the
+    valid rows returned by ``validate_time_entries``, which are not checked
+    again. Valid rows are inserted with executemany in batches of
+    ``batch_size``; daily rollups, totals and milestones are then updated
+    once per affected day and activity rather than once per entry. Returns a
+    dict with the ``inserted`` and
+    ``rejected`` counts and the ``rejected_rows`` DataFrame, which carries a
+    ``reason`` column.
+    """
+    df = entries if isinstance(entries, pd.DataFrame) else pd.DataFrame(list(entries))
+    df = df.reset_index(drop=True)
+    if df.empty:
+        return {'inserted': 0, 'rejected': 0, 'rejected_rows': df}
+    
+    user_id = current_user_id()
     db = get_db_session()
     try:
-        query = db.query(TimeEntry, Activity.name.label('activity_name')).join(
-            Activity, TimeEntry.activity_id == Activity.id
+        if validated:
+            valid = df[['activity_id', 'hours', 'date', 'notes']]
+            rejected = df.iloc[:0].assign(reason='')
+        else:
+            valid, rejected = validate_time_entries(df, _user_activity_ids(db))
+        
+        if not valid.empty:
+            rows = [
+                {
+                    'user_id': user_id,
+                    'activity_id': activity_id,
+                    'hours': hours,
+                    'date': date.to_pydatetime(),
+                    'notes': notes
+                }
+                for activity_id, hours, date, notes in valid.itertuples(index=False)
+            ]
+            for start in range(0, len(rows), batch_size):
+                db.execute(TimeEntry.__table__.insert(), rows[start:start + batch_size])
+            
+            daily = valid.groupby(['activity_id', valid['date'].dt.date]).agg(
+                hours=('hours', 'sum'),
+                sessions=('hours', 'size')
+            ).reset_index().rename(columns={'date': 'day'}).assign(user_id=user_id)
+            _update_daily_rollups(db, daily.to_dict('records'))
+            
+            totals = valid.groupby('activity_id').agg(
+                total_hours=('hours', 'sum'),
+                session_count=('hours', 'size'),
+                first_entry=('date', 'min'),
+                last_entry=('date', 'max')
+            ).reset_index()
+            _update_activity_totals(db, [
+                {
+                    'activity_id': int(row.activity_id),
+                    'user_id': user_id,
+                    'total_hours': float(row.total_hours),
+                    'session_count': int(row.session_count),
+                    'first_entry': row.first_entry.to_pydatetime(),
+                    'last_entry': row.last_entry.to_pydatetime()
+                }
+                for row in totals.itertuples(index=False)
+            ])
+            
+            _record_milestones(db, totals['activity_id'].tolist())
+            _bump_write_generation(db)
+        
+        db.commit()
+        return {
+            'inserted': len(valid),
+            'rejected': len(rejected),
+            'rejected_rows': rejected
+        }
+    finally:
+        db.close()
+
+def _time_entry_columns(entries):
+    """Get the columns available to get_time_entries_df, in their default order.
+    
+    ``entries`` is ``time_entries`` or its archive. ``date`` is the day of the
+    entry and ``timestamp`` the full start time.
+    """
+    return {
+        'id': entries.c.id,
+        'activity_id': entries.c.activity_id,
+        'activity_name': Activity.name,
+        'activity_category': Activity.category,
+        'activity_description': Activity.description,
+        'hours': entries.c.hours,
+        'date': day_of(entries.c.date),
+        'timestamp': type_coerce(entries.c.date, String),
+        'notes': entries.c.notes
+    }
+
+TIME_ENTRY_COLUMNS = _time_entry_columns(TimeEntry.__table__)
+DEFAULT_TIME_ENTRY_COLUMNS = ['id', 'activity_id', 'activity_name', 'hours', 'date', 'notes']
+
+def _archived_before(db):
+    """Get the time before which entries may have been archived, or None."""
+    return db.execute(select(DatabaseState.archived_before).where(DatabaseState.id == 1)).scalar()
+
+def _entry_tables(db, start_date=None):
+    """Get the tables holding the entries from ``start_date`` on.
+    
+    The archive is only included when the range starts before
+    ``archived_before``; archived entries past it are ignored (see
+    ``database.all_time_entries``).
+    """
+    archived_before = _archived_before(db)
+    if archived_before is None or (start_date and start_of_day(start_date) >= archived_before):
+        return [(TimeEntry.__table__, None)]
+    return [(TimeEntry.__table__, None), (ArchivedTimeEntry.__table__, archived_before)]
+
+def _entries_select(statement, entries, until, start_date=None, end_date=None, activity_id=None):
+    """Filter a SELECT over one entries table by user, date range and activity."""
+    statement = statement.where(entries.c.user_id == current_user_id())
+    # Half-open datetime ranges keep the filters on the indexed column
+    if start_date:
+        statement = statement.where(entries.c.date >= start_of_day(start_date))
+    if end_date:
+        statement = statement.where(entries.c.date < start_of_day(end_date) + timedelta(days=1))
+    if until is not None:
+        statement = statement.where(entries.c.date < until)
+    if activity_id is not None:
+        statement = statement.where(entries.c.activity_id == activity_id)
+    return statement
+
+def _time_entries_select(db, columns, start_date=None, end_date=None, activity_id=None):
+    """Build a Core SELECT for the requested time entry columns.
+    
+    The archive is unioned in only when the range reaches it.
+    """
+    selects = []
+    for entries, until in _entry_tables(db, start_date):
+        entry_columns = _time_entry_columns(entries)
+        statement = select(*[entry_columns[name].label(name) for name in columns])
+        if any(name.startswith('activity_') and name != 'activity_id' for name in columns):
+            statement = statement.join(Activity, entries.c.activity_id == Activity.id)
+        else:
+            statement = statement.select_from(entries)
+        selects.append(_entries_select(statement, entries, until, start_date, end_date, activity_id))
+    
+    return selects[0] if len(selects) == 1 else union_all(*selects)
+
+def _time_entries_frame(rows, columns, activity_names):
+    """Turn a batch of row tuples into a DataFrame with typed columns."""
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    data = {}
+    for name, column in zip(columns, values):
+        if name in ('id', 'activity_id'):
+            data[name] = np.array(column, dtype=np.int32)
+        elif name == 'hours':
+            data[name] = np.array(column, dtype=np.float64)
+        elif name == 'date':
+            data[name] = pd.to_datetime(pd.Series(column, dtype=object), format='%Y-%m-%d')
+        elif name == 'timestamp':
+            data[name] = pd.to_datetime(pd.Series(column, dtype=object), format='ISO8601')
+        elif name == 'activity_name':
+            data[name] = pd.Categorical(column, categories=activity_names)
+        else:
+            data[name] = pd.Series(column, dtype=object)
+    return pd.DataFrame(data, columns=columns)
+
+def iter_time_entries(start_date=None, end_date=None, columns=None, activity_id=None, chunksize=50000):
+    """Yield time entries as DataFrame chunks of at most ``chunksize`` rows.
+    
+    Rows are streamed with a Core query (no ORM objects) and converted column
+    by column. Only the requested ``columns`` (see ``TIME_ENTRY_COLUMNS``) are
+    loaded, so callers that don't need ``notes`` never fetch it.
+    """
+    columns = list(columns or DEFAULT_TIME_ENTRY_COLUMNS)
+    with _read_session() as db:
+        # Fixed categories keep activity_name categorical across chunks
+        activity_names = [
+            name for (name,) in db.query(Activity.name).filter(
+                Activity.user_id == current_user_id()
+            ).distinct().order_by(Activity.name)
+        ]
+        statement = _time_entries_select(db, columns, start_date, end_date, activity_id)
+        result = db.connection().execute(statement.execution_options(yield_per=chunksize))
+        
+        empty = True
+        for rows in result.partitions():
+            empty = False
+            yield _time_entries_frame(rows, columns, activity_names)
+        if empty:
+            yield _time_entries_frame([], columns, activity_names)
+
+@_cached
+def get_time_entries_df(start_date=None, end_date=None, columns=None, activity_id=None):
+    """Get time entries as a pandas DataFrame."""
+    chunks = list(iter_time_entries(start_date, end_date, columns, activity_id))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+@_cached
+def get_recent_time_entries(activity_id, limit=10, start_date=None, end_date=None):
+    """Get the newest ``limit`` time entries of an activity, newest first.
+    
+    Each table is read newest first along its activity index. The archive is
+    only read when archived entries could be among the newest: when the hot
+    table has fewer than ``limit`` of them or the oldest predates
+    ``archived_before``.
+    """
+    columns = ['date', 'hours', 'notes']
+    with _read_session() as db:
+        rows = []
+        for entries, until in _entry_tables(db, start_date):
+            if until is not None and len(rows) == limit and rows[-1][0] >= until:
+                break
+            entry_columns = _time_entry_columns(entries)
+            statement = select(
+                entries.c.date.label('started_at'), *[entry_columns[name].label(name) for name in columns]
+            ).select_from(entries)
+            statement = _entries_select(statement, entries, until, start_date, end_date, activity_id)
+            rows += db.execute(statement.order_by(entries.c.date.desc()).limit(limit)).all()
+        
+        rows = sorted(rows, key=lambda row: row[0], reverse=True)[:limit]
+        return _time_entries_frame([row[1:] for row in rows], columns, None)
+
+def _rollup_bucket(freq):
+    """Get the SQL expression that buckets rollup days by day, week or month."""
+    if freq == 'D':
+        return DailyRollup.day
+    if freq == 'W':
+        return week_start(DailyRollup.day)
+    if freq == 'M':
+        return month_start(DailyRollup.day)
+    raise ValueError(f"Unsupported frequency: {freq}")
+
+@_cached
+def get_daily_hours_df(start_date=None, end_date=None, freq='D', activity_id=None):
+    """Get hours and session counts per activity per day, week or month.
+    
+    Served from the ``daily_rollups`` table, so the cost is proportional to the
+    number of active days rather than the number of sessions. ``freq`` is
+    ``'D'``, ``'W'`` (weeks starting Monday) or ``'M'``.
+    """
+    with _read_session() as db:
+        bucket = _rollup_bucket(freq)
+        query = db.query(
+            DailyRollup.activity_id.label('activity_id'),
+            Activity.name.label('activity_name'),
+            bucket.label('date'),
+            func.sum(DailyRollup.hours).label('hours'),
+            func.sum(DailyRollup.sessions).label('sessions')
+        ).join(
+            Activity, DailyRollup.activity_id == Activity.id
+        ).filter(
+            DailyRollup.user_id == current_user_id()
         )
         
         if start_date:
-            query = query.filter(func.date(TimeEntry.date) >= start_date)
+            query = query.filter(DailyRollup.day >= start_of_day(start_date).date())
         if end_date:
-            query = query.filter(func.date(TimeEntry.date) <= end_date)
+            query = query.filter(DailyRollup.day <= start_of_day(end_date).date())
+        if activity_id is not None:
+            query = query.filter(DailyRollup.activity_id == activity_id)
         
-        results = query.all()
+        rows = query.group_by(
+            DailyRollup.activity_id, Activity.name, bucket
+        ).order_by(bucket, DailyRollup.activity_id).all()
         
-        data = []
-        for entry, activity_name in results:
-            data.append({
-                'id': entry.id,
-                'activity_id': entry.activity_id,
-                'activity_name': activity_name,
-                'hours': entry.hours,
-                'date': entry.date.date(),
-                'notes': entry.notes
-            })
+        df = pd.DataFrame(rows, columns=['activity_id', 'activity_name', 'date', 'hours', 'sessions'])
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+@_cached
+def get_hour_of_day_hours_df(start_date=None, end_date=None, activity_id=None):
+    """Get total hours per hour of the day at which sessions were logged."""
+    with _read_session() as db:
+        selects = []
+        for entries, until in _entry_tables(db, start_date):
+            statement = select(
+                cast(extract('hour', entries.c.date), Integer).label('hour'),
+                entries.c.hours
+            )
+            selects.append(_entries_select(statement, entries, until, start_date, end_date, activity_id))
         
-        return pd.DataFrame(data)
-    finally:
-        db.close()
+        entries = (union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+        rows = db.execute(
+            select(entries.c.hour, func.sum(entries.c.hours).label('hours'))
+            .group_by(entries.c.hour).order_by(entries.c.hour)
+        ).all()
+        return pd.DataFrame(rows, columns=['hour', 'hours'])
+
+@_cached
+def get_series(start_date=None, end_date=None):
+    """Get the aggregated series for the Statistics page (see ``build_series``)."""
+    return build_series(
+        get_daily_hours_df(start_date, end_date),
+        get_hour_of_day_hours_df(start_date, end_date),
+        end_date
+    )
 
+@_cached
 def get_activity_names():
     """Get all activity names."""
-    db = get_db_session()
-    try:
-        activities = db.query(Activity.name).all()
+    with _read_session() as db:
+        activities = db.query(Activity.name).filter(Activity.user_id == current_user_id()).all()
         return [activity.name for activity in activities]
-    finally:
-        db.close()
 
+@_cached
 def get_milestones(activity_id):
     """Get milestones for an activity."""
-    db = get_db_session()
-    try:
+    with _read_session() as db:
         milestones = db.query(Milestone).filter(
+            Milestone.user_id == current_user_id(),
             Milestone.activity_id == activity_id
         ).order_by(Milestone.hours_reached).all()
-        return milestones
-    finally:
-        db.close() 
\ No newline at end of file
+        return [
+            {
+                'id': milestone.id,
+                'activity_id': milestone.activity_id,
+                'hours_reached': milestone.hours_reached,
+                'reached_at': milestone.reached_at
+            }
+            for milestone in milestones
+        ]
+ 
\ No newline at end of file
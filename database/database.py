@@ -1,29 +1,355 @@
 import sqlite3
-from sqlalchemy import create_engine
+from contextlib import closing
+from sqlalchemy import create_engine, event, inspect, select, delete, func, union_all, make_url
 from sqlalchemy.orm import sessionmaker
-from .models import Base
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateSchema, CreateTable
+from .models import Base, ArchiveBase, TimeEntry, ArchivedTimeEntry, DailyRollup, ActivityTotals, DatabaseState
+from .dialects import day_of
+from .engine_pool import EnginePool
+from .users import current_user_id, user_slug
+import config
+import streamlit as st
+from streamlit import runtime
 import os
 
-# Database file path
-DB_PATH = "tracker.db"
+# Shared database file path
+DB_PATH = config.DB_PATH
 
-# Create engine
-engine = create_engine(f'sqlite:///{DB_PATH}', echo=False)
+def database_path(user_id=None):
+    """Get the database file of a user (the shared one unless DB_PER_USER)."""
+    if not config.DB_PER_USER:
+        return DB_PATH
+    return os.path.join(config.USER_DB_DIR, f"{user_slug(user_id or current_user_id())}.db")
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def archive_path(db_path):
+    """Get the archive database that belongs to a database file."""
+    if db_path == DB_PATH:
+        return config.ARCHIVE_PATH
+    return os.path.splitext(db_path)[0] + '_archive.db'
 
-def init_db():
-    """Initialize the database by creating all tables."""
+def database_url(user_id=None):
+    """Get the URL of a user's database: DATABASE_URL, or their SQLite file."""
+    return config.DATABASE_URL or f'sqlite:///{database_path(user_id)}'
+
+def _create_engine(url):
+    """Create an engine with the configured pool, and the SQLite profile for SQLite."""
+    url = make_url(url)
+    pool = {
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT
+    }
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(
+            url,
+            echo=False,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            **pool
+        )
+    
+    engine = create_engine(
+        url,
+        echo=False,
+        connect_args={'timeout': config.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **pool
+    )
+    archive = archive_path(url.database)
+    event.listen(
+        engine, 'connect',
+        lambda dbapi_connection, connection_record: _apply_sqlite_pragmas(dbapi_connection, archive)
+    )
+    return engine
+
+def _apply_sqlite_pragmas(dbapi_connection, archive):
+    """Apply the configured SQLite profile to a new connection and attach the archive."""
+    cursor = dbapi_connection.cursor()
+    try:
+        # Only takes effect for new databases; `python -m database.maintenance
+        # vacuum` converts old ones
+        cursor.execute(f"PRAGMA auto_vacuum={config.SQLITE_AUTO_VACUUM}")
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA temp_store={config.SQLITE_TEMP_STORE}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive,))
+    finally:
+        cursor.close()
+
+def _open_engine(url):
+    """Create the engine for a database and bring its schema up to date."""
+    engine = _create_engine(url)
+    if engine.dialect.name == 'sqlite':
+        directory = os.path.dirname(engine.url.database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    init_db(engine)
+    return engine
+
+def _create_engine_pool():
+    """Create the pool of open engines, one per database."""
+    return EnginePool(config.DB_ENGINE_CACHE_SIZE, _open_engine)
+
+# Under Streamlit the pool is cached as a resource, so every session and
+# script rerun shares the engines even when this module is reloaded
+engine_pool = (st.cache_resource(_create_engine_pool) if runtime.exists() else _create_engine_pool)()
+
+def get_engine():
+    """Get the engine for the current user's database."""
+    return engine_pool.get(database_url())
+
+def is_sqlite():
+    """Check whether the current user's database is SQLite."""
+    return get_engine().dialect.name == 'sqlite'
+
+# Sessions are bound to the current user's engine when they are created
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+def init_db(engine):
+    """Initialize the database by creating all tables.
+    
+    SQLite keeps the archive in an attached file; other databases keep it in
+    an ``archive`` schema, created here.
+    """
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as connection:
+            connection.execute(CreateSchema('archive', if_not_exists=True))
+    
+    inspector = inspect(engine)
+    existing_tables = {
+        f"{schema}.{name}" if schema else name
+        for schema in (None, 'archive')
+        for name in inspector.get_table_names(schema=schema)
+    }
     Base.metadata.create_all(bind=engine)
+    ArchiveBase.metadata.create_all(bind=engine)
+    upgrade_db(engine, existing_tables)
+
+def upgrade_db(engine, existing_tables):
+    """Bring an existing database up to date with the current models.
+    
+    ``create_all`` skips tables that already exist, so columns and indexes
+    added to the models after a database was created are created here
+    instead, and indexes whose columns or uniqueness have since changed are
+    rebuilt, after which the planner statistics are refreshed. A SQLite
+    ``time_entries`` table from before AUTOINCREMENT is rebuilt with it.
+    Derived tables that were just created are backfilled from ``time_entries``.
+    """
+    inspector = inspect(engine)
+    tables = Base.metadata.sorted_tables + ArchiveBase.metadata.sorted_tables
+    for table in tables:
+        if table.fullname not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name, schema=table.schema)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {table.fullname} ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}"
+                    )
+    
+    if engine.dialect.name == 'sqlite' and TimeEntry.__tablename__ in existing_tables:
+        _enable_autoincrement(engine)
+    
+    indexes_changed = False
+    for table in tables:
+        existing_indexes = {
+            index['name']: index for index in inspector.get_indexes(table.name, schema=table.schema)
+        }
+        for index in table.indexes:
+            existing = existing_indexes.get(index.name)
+            if existing and (
+                bool(existing['unique']) != bool(index.unique)
+                or existing['column_names'] != [column.name for column in index.columns]
+            ):
+                index.drop(bind=engine)
+                existing = None
+            if not existing:
+                if index.unique:
+                    _remove_duplicates(engine, table, index.columns)
+                index.create(bind=engine)
+                indexes_changed = True
+    
+    if indexes_changed:
+        # Let the planner know how selective the new indexes are, e.g. that
+        # a database with a single user should be scanned rather than
+        # searched by user_id
+        with engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE")
+    
+    with engine.begin() as connection:
+        for table_name, rebuild in DERIVED_TABLES.items():
+            if table_name not in existing_tables:
+                rebuild(connection)
+        
+        if connection.execute(select(DatabaseState.id)).first() is None:
+            connection.execute(DatabaseState.__table__.insert().values(id=1, write_generation=0))
+
+def _enable_autoincrement(engine):
+    """Rebuild a SQLite ``time_entries`` table that may reuse ids with AUTOINCREMENT.
+    
+    Without it SQLite hands out the id of a deleted newest entry again, which
+    can be the id of an archived entry. The counter starts past every id in
+    either table. The rebuild is one transaction, so an interrupted one
+    leaves the old table in place.
+    """
+    table = TimeEntry.__table__
+    with engine.connect() as connection:
+        schema = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+    if 'AUTOINCREMENT' in schema.upper():
+        return
+    
+    columns = ', '.join(column.name for column in table.columns)
+    statements = [
+        f"ALTER TABLE {table.name} RENAME TO {table.name}_old",
+        str(CreateTable(table).compile(dialect=engine.dialect)),
+        f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old",
+        f"DROP TABLE {table.name}_old",
+        *[str(CreateIndex(index).compile(dialect=engine.dialect)) for index in table.indexes],
+        f"DELETE FROM sqlite_sequence WHERE name = '{table.name}'",
+        f"INSERT INTO sqlite_sequence (name, seq) SELECT '{table.name}', max("
+        f"(SELECT coalesce(max(id), 0) FROM main.{table.name}), "
+        f"(SELECT coalesce(max(id), 0) FROM archive.{table.name}))",
+    ]
+    # The driver does not wrap DDL in its transactions, so run the rebuild as
+    # a script with its own; the pool rolls back a failed one
+    with closing(engine.raw_connection()) as raw_connection:
+        raw_connection.driver_connection.executescript(
+            'BEGIN; ' + '; '.join(statements) + '; COMMIT;'
+        )
+
+def _remove_duplicates(engine, table, columns):
+    """Keep only the oldest row for each combination of the given columns."""
+    keep = select(func.min(table.c.id)).group_by(*columns)
+    with engine.begin() as connection:
+        connection.execute(delete(table).where(table.c.id.not_in(keep)))
+
+def all_time_entries():
+    """Get ``time_entries`` together with the archived entries as one subquery.
+    
+    Archived entries only count up to ``archived_before``, so entries that an
+    interrupted archival run already copied but did not yet delete from
+    ``time_entries`` are not counted twice.
+    """
+    archived_before = select(DatabaseState.archived_before).where(DatabaseState.id == 1).scalar_subquery()
+    return union_all(
+        select(TimeEntry.id, TimeEntry.user_id, TimeEntry.activity_id, TimeEntry.hours, TimeEntry.date),
+        select(
+            ArchivedTimeEntry.id,
+            ArchivedTimeEntry.user_id,
+            ArchivedTimeEntry.activity_id,
+            ArchivedTimeEntry.hours,
+            ArchivedTimeEntry.date
+        ).where(ArchivedTimeEntry.date < archived_before)
+    ).subquery('all_time_entries')
+
+def rebuild_daily_rollups(connection, user_id=None):
+    """Recompute the ``daily_rollups`` table, or one user's rows, from all time entries."""
+    entries = all_time_entries()
+    statement = select(
+        entries.c.activity_id,
+        day_of(entries.c.date),
+        entries.c.user_id,
+        func.sum(entries.c.hours),
+        func.count(entries.c.id)
+    ).group_by(entries.c.activity_id, day_of(entries.c.date), entries.c.user_id)
+    
+    if user_id is None:
+        connection.execute(delete(DailyRollup))
+    else:
+        connection.execute(delete(DailyRollup).where(DailyRollup.user_id == user_id))
+        statement = statement.where(entries.c.user_id == user_id)
+    connection.execute(DailyRollup.__table__.insert().from_select(
+        ['activity_id', 'day', 'user_id', 'hours', 'sessions'], statement
+    ))
+
+def rebuild_activity_totals(connection, user_id=None):
+    """Recompute the ``activity_totals`` table, or one user's rows, from all time entries."""
+    entries = all_time_entries()
+    statement = select(
+        entries.c.activity_id,
+        entries.c.user_id,
+        func.sum(entries.c.hours),
+        func.count(entries.c.id),
+        func.min(entries.c.date),
+        func.max(entries.c.date)
+    ).group_by(entries.c.activity_id, entries.c.user_id)
+    
+    if user_id is None:
+        connection.execute(delete(ActivityTotals))
+    else:
+        connection.execute(delete(ActivityTotals).where(ActivityTotals.user_id == user_id))
+        statement = statement.where(entries.c.user_id == user_id)
+    connection.execute(ActivityTotals.__table__.insert().from_select(
+        ['activity_id', 'user_id', 'total_hours', 'session_count', 'first_entry', 'last_entry'], statement
+    ))
+
+# Tables derived from time_entries, with the function that rebuilds each one
+DERIVED_TABLES = {
+    DailyRollup.__tablename__: rebuild_daily_rollups,
+    ActivityTotals.__tablename__: rebuild_activity_totals,
+}
+
+def rebuild_derived_tables():
+    """Recompute every derived table from ``time_entries`` in one transaction.
+    
+    The write generation is bumped in the same transaction, so running
+    servers stop serving cached results computed from the old tables.
+    """
+    with get_engine().begin() as connection:
+        for rebuild in DERIVED_TABLES.values():
+            rebuild(connection)
+        connection.execute(
+            DatabaseState.__table__.update()
+            .where(DatabaseState.id == 1)
+            .values(write_generation=DatabaseState.write_generation + 1)
+        )
+
+def reclaim_space(convert=False):
+    """Hand the pages freed by deletes back to the file system.
+    
+    Only a database in incremental auto-vacuum mode releases its free pages.
+    With ``convert`` one created without it is converted by a full VACUUM,
+    which rewrites the file under an exclusive lock, so only the maintenance
+    command asks for that. A checkpoint then truncates the WAL, so the
+    database file actually shrinks. On
+    PostgreSQL the tables deletes shrink are vacuumed and analyzed instead of
+    waiting for autovacuum.
+    """
+    engine = get_engine()
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if engine.dialect.name != 'sqlite':
+            for table in (TimeEntry.__table__, ArchivedTimeEntry.__table__, DailyRollup.__table__):
+                connection.exec_driver_sql(f"VACUUM ANALYZE {table.fullname}")
+            return
+        
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:  # 2 = incremental
+            # pysqlite steps a statement only once, which frees a single page;
+            # a script runs the pragma to completion
+            schemas = ['main'] + (
+                ['archive'] if connection.exec_driver_sql("PRAGMA archive.auto_vacuum").scalar() == 2 else []
+            )
+            connection.connection.driver_connection.executescript(
+                ''.join(f"PRAGMA {schema}.incremental_vacuum;" for schema in schemas)
+            )
+        elif convert:
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        # Large deletes change how selective the indexes are
+        connection.exec_driver_sql("PRAGMA optimize")
 
 def get_db():
     """Get database session."""
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
 
-# Initialize database when module is imported
-init_db() 
\ No newline at end of file
+# Open (and initialize) the current user's database when the module is imported
+get_engine() 
\ No newline at end of file
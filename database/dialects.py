@@ -0,0 +1,92 @@
+"""SQL that differs between the supported databases, SQLite and PostgreSQL.
+
+SQLite keeps dates as text and has its own date functions, while PostgreSQL
+has real date types and truncation. Each expression here compiles to the
+native form on either database, so queries are written once. The date
+expressions are untyped, so SQLite's text dates reach pandas unparsed.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+class day_of(FunctionElement):
+    """The day of a timestamp."""
+    name = 'day_of'
+    inherit_cache = True
+
+class week_start(FunctionElement):
+    """The Monday of the week containing a day."""
+    name = 'week_start'
+    inherit_cache = True
+
+class month_start(FunctionElement):
+    """The first day of the month containing a day."""
+    name = 'month_start'
+    inherit_cache = True
+
+class least(FunctionElement):
+    """The smaller of two values."""
+    name = 'least'
+    inherit_cache = True
+
+class greatest(FunctionElement):
+    """The larger of two values."""
+    name = 'greatest'
+    inherit_cache = True
+
+@compiles(day_of)
+def _day_of(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS DATE)"
+
+@compiles(day_of, 'sqlite')
+def _day_of_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)})"
+
+@compiles(week_start)
+def _week_start(element, compiler, **kw):
+    # PostgreSQL weeks start on Monday
+    return f"CAST(date_trunc('week', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+@compiles(week_start, 'sqlite')
+def _week_start_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, 'weekday 0', '-6 days')"
+
+@compiles(month_start)
+def _month_start(element, compiler, **kw):
+    return f"CAST(date_trunc('month', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+@compiles(month_start, 'sqlite')
+def _month_start_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, 'start of month')"
+
+@compiles(least)
+def _least(element, compiler, **kw):
+    return f"LEAST({compiler.process(element.clauses, **kw)})"
+
+@compiles(least, 'sqlite')
+def _least_sqlite(element, compiler, **kw):
+    # SQLite's min() with several arguments is a scalar function
+    return f"min({compiler.process(element.clauses, **kw)})"
+
+@compiles(greatest)
+def _greatest(element, compiler, **kw):
+    return f"GREATEST({compiler.process(element.clauses, **kw)})"
+
+@compiles(greatest, 'sqlite')
+def _greatest_sqlite(element, compiler, **kw):
+    return f"max({compiler.process(element.clauses, **kw)})"
+
+# INSERT constructs that support ON CONFLICT, by dialect name
+_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def dialect_insert(db, table):
+    """Build an INSERT with ON CONFLICT support for the database behind ``db``.
+    
+    ``db`` is a session, connection or engine.
+    """
+    bind = db.get_bind() if isinstance(db, Session) else db
+    return _INSERTS[bind.dialect.name](table)
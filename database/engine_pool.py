@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from threading import Lock
+
+class EnginePool:
+    """A thread-safe, size-bounded LRU pool of database engines.
+    
+    Engines are opened on first use with ``open_engine(path)``. When more than
+    ``maxsize`` are open, the least recently used one is disposed, which
+    closes its idle connections; connections still in use are closed as soon
+    as they are returned.
+    """
+    
+    def __init__(self, maxsize, open_engine):
+        self.maxsize = maxsize
+        self._open_engine = open_engine
+        self._engines = OrderedDict()
+        self._lock = Lock()
+    
+    def get(self, path):
+        """Get the engine for a database file, opening it if needed."""
+        with self._lock:
+            engine = self._engines.get(path)
+            if engine is None:
+                engine = self._engines[path] = self._open_engine(path)
+            self._engines.move_to_end(path)
+            
+            while len(self._engines) > self.maxsize:
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+    
+    def dispose(self):
+        """Dispose every open engine."""
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+    
+    def __len__(self):
+        return len(self._engines)
@@ -0,0 +1,68 @@
+"""Streaming export of time entries to CSV or Parquet.
+
+Rows are read from the database in chunks (see ``crud.iter_time_entries``) and
+appended to a temporary file, so no export holds every row in memory at once.
+"""
+import tempfile
+from .crud import iter_time_entries
+from .users import current_user_id, user_scope
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+EXPORT_COLUMNS = [
+    'id', 'activity_id', 'activity_name', 'activity_category', 'activity_description',
+    'hours', 'date', 'timestamp', 'notes'
+]
+
+def _write_csv(file, chunks):
+    """Append each chunk to the file as CSV, writing the header once."""
+    for index, chunk in enumerate(chunks):
+        file.write(chunk.to_csv(index=False, header=index == 0).encode())
+
+def _write_parquet(file, chunks):
+    """Write each chunk to the file as a Parquet row group."""
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(file, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+EXPORT_FORMATS = {
+    'csv': (_write_csv, 'text/csv'),
+}
+if pq is not None:
+    EXPORT_FORMATS['parquet'] = (_write_parquet, 'application/vnd.apache.parquet')
+
+def export_time_entries(fmt='csv', start_date=None, end_date=None, activity_id=None, chunksize=50000, user_id=None):
+    """Export time entries with activity details to a temporary file.
+    
+    Exports the entries of ``user_id``, by default the current user. Pass it
+    when the export runs off the script thread, e.g. from a deferred
+    ``st.download_button``, where the logged-in user is not known. Returns
+    the file rewound to the start; it is deleted once closed.
+    """
+    write, _ = EXPORT_FORMATS[fmt]
+    # Unbuffered, so callers get a raw file object they can read in one call;
+    # every write is already a whole chunk
+    file = tempfile.TemporaryFile(buffering=0)
+    try:
+        with user_scope(user_id or current_user_id()):
+            write(file, iter_time_entries(start_date, end_date, EXPORT_COLUMNS, activity_id, chunksize))
+    except Exception:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+def export_mime_type(fmt):
+    """Get the MIME type of an export format."""
+    return EXPORT_FORMATS[fmt][1]
@@ -0,0 +1,140 @@
+"""Chunked CSV import of time entries.
+
+Files are read ``chunksize`` rows at a time, so even very large files are
+never fully loaded into memory. Files written by ``database.export`` can be
+imported as-is.
+"""
+import numpy as np
+import pandas as pd
+from .crud import (
+    add_time_entries_bulk,
+    get_activities,
+    get_or_create_activities,
+    iter_time_entries,
+    validate_time_entries
+)
+
+# Rejected rows kept for the import summary; the rest are only counted
+MAX_REJECTED_ROWS = 1000
+
+def _content_hashes(activity_id, date, hours, notes):
+    """Hash time entries by content, so the same entry always gets the same hash."""
+    return pd.util.hash_pandas_object(pd.DataFrame({
+        'activity_id': np.asarray(activity_id, dtype=np.int64),
+        'date': np.asarray(date, dtype='datetime64[us]').astype(np.int64),
+        'hours': np.round(np.asarray(hours, dtype=float), 6),
+        'notes': pd.Series(notes, dtype=object).fillna('').astype(str).values
+    }), index=False).to_numpy()
+
+def _existing_hashes():
+    """Get the sorted content hashes of every time entry in the database."""
+    hashes = [
+        _content_hashes(chunk['activity_id'], chunk['timestamp'], chunk['hours'], chunk['notes'])
+        for chunk in iter_time_entries(columns=['activity_id', 'hours', 'timestamp', 'notes'])
+    ]
+    return np.unique(np.concatenate(hashes))
+
+def _read_chunks(file, chunksize):
+    """Read the CSV in chunks of strings, checking the columns once."""
+    chunks = pd.read_csv(file, chunksize=chunksize, dtype=str, keep_default_na=False)
+    for chunk in chunks:
+        if 'hours' not in chunk or not ({'activity_name', 'activity_id'} & set(chunk.columns)):
+            raise ValueError("The CSV needs an 'hours' column and an 'activity_name' or 'activity_id' column")
+        yield chunk
+
+def import_time_entries(file, chunksize=50000, progress=None):
+    """Import time entries from a CSV file.
+    
+    Activities are matched by ``activity_name`` or by ``activity_id``. A
+    missing activity is created once one of its rows passes validation, so
+    rejected rows never add activities. The entry time comes from
+    ``timestamp`` or ``date``. Entries whose activity, time, hours and notes
+    match an existing entry or an earlier row of the file are skipped, so
+    importing the same file twice adds nothing the second time. Each chunk is
+    validated and inserted in its own transaction. ``progress`` is called
+    after each chunk with the fraction of the file read and the number of
+    rows processed.
+    
+    Returns a dict with the ``inserted``, ``duplicates`` and ``rejected``
+    counts, the number of ``created_activities`` and up to
+    ``MAX_REJECTED_ROWS`` ``rejected_rows`` with their CSV ``line`` and a
+    ``reason``.
+    """
+    file.seek(0, 2)
+    size = file.tell() or 1
+    file.seek(0)
+    
+    known_hashes = _existing_hashes()
+    activities = get_activities()
+    user_activity_ids = {activity['id'] for activity in activities}
+    # Activity ids by name; the oldest activity wins when names repeat
+    activity_ids = {}
+    for activity in activities:
+        activity_ids.setdefault(activity['name'], activity['id'])
+    summary = {'inserted': 0, 'duplicates': 0, 'rejected': 0, 'created_activities': 0}
+    rejected_rows = []
+    rows_read = 0
+    
+    for chunk in _read_chunks(file, chunksize):
+        # CSV line numbers, counting the header as line 1
+        chunk.index = pd.RangeIndex(rows_read + 2, rows_read + 2 + len(chunk), name='line')
+        rows_read += len(chunk)
+        columns = list(chunk.columns)
+        
+        # Activities that don't exist yet get placeholder ids below zero
+        # until one of their rows is valid
+        new_activities = {}
+        if 'activity_name' in chunk:
+            names = chunk['activity_name'].str.strip()
+            new = ~names.isin(list(activity_ids)) & (names != '')
+            new_activities = {name: -index for index, name in enumerate(names[new].unique(), 1)}
+            chunk['activity_id'] = names.map({**activity_ids, **new_activities})
+        
+        if 'timestamp' in chunk:
+            date = chunk['timestamp'].where(chunk['timestamp'] != '', chunk.get('date', ''))
+        else:
+            date = chunk.get('date')
+        entries = pd.DataFrame({
+            'activity_id': chunk['activity_id'],
+            'hours': chunk['hours'],
+            'notes': chunk.get('notes', '')
+        }, index=chunk.index)
+        if date is not None:
+            entries['date'] = date
+        
+        valid, rejected = validate_time_entries(entries, list(user_activity_ids) + list(new_activities.values()))
+        
+        used = valid['activity_id'] < 0
+        if used.any():
+            new_rows = chunk.loc[valid.index[used]]
+            created = get_or_create_activities(pd.DataFrame({
+                'name': new_rows['activity_name'].str.strip(),
+                'category': new_rows.get('activity_category', pd.Series('', index=new_rows.index)),
+                'description': new_rows.get('activity_description', pd.Series('', index=new_rows.index))
+            }))
+            activity_ids.update(created)
+            user_activity_ids.update(created.values())
+            summary['created_activities'] += len(created)
+            placeholders = {new_activities[name]: activity_id for name, activity_id in created.items()}
+            valid.loc[used, 'activity_id'] = valid.loc[used, 'activity_id'].map(placeholders)
+        
+        hashes = _content_hashes(valid['activity_id'], valid['date'], valid['hours'], valid['notes'])
+        duplicate = np.isin(hashes, known_hashes) | pd.Series(hashes).duplicated().to_numpy()
+        summary['duplicates'] += int(duplicate.sum())
+        
+        summary['inserted'] += add_time_entries_bulk(valid[~duplicate], validated=True)['inserted']
+        known_hashes = np.union1d(known_hashes, hashes[~duplicate])
+        
+        rejected = chunk.loc[rejected.index, columns].assign(reason=rejected['reason'])
+        summary['rejected'] += len(rejected)
+        if sum(len(rows) for rows in rejected_rows) < MAX_REJECTED_ROWS:
+            rejected_rows.append(rejected)
+        
+        if progress is not None:
+            progress(min(file.tell() / size, 1.0), rows_read)
+    
+    summary['rejected_rows'] = (
+        pd.concat(rejected_rows).head(MAX_REJECTED_ROWS).reset_index() if rejected_rows
+        else pd.DataFrame(columns=['line', 'reason'])
+    )
+    return summary
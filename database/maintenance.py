@@ -0,0 +1,81 @@
+"""Database maintenance commands.
+
+Run from the project root, e.g. ``python -m database.maintenance rebuild`` or
+``python -m database.maintenance restore backups/tracker_backup_....db.gz``.
+"""
+import argparse
+import os
+from .database import get_engine, rebuild_derived_tables, reclaim_space, database_path, is_sqlite
+from .backup import create_backup
+from .restore import RESTORE_MODES, restore_database
+from .archive import archive_time_entries
+from .users import user_scope
+import config
+from .models import ActivityTotals, DailyRollup
+from sqlalchemy import select, func
+
+def rebuild(args):
+    """Reconcile every derived table against ``time_entries``."""
+    rebuild_derived_tables()
+
+    with get_engine().connect() as connection:
+        totals = connection.execute(select(func.count()).select_from(ActivityTotals)).scalar()
+        rollups = connection.execute(select(func.count()).select_from(DailyRollup)).scalar()
+
+    print(f"Rebuilt totals for {totals} activities and {rollups} daily rollups")
+
+def backup(args):
+    """Write a database snapshot to the backups directory."""
+    path = create_backup()
+    print(f"Wrote {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MiB)")
+
+def restore(args):
+    """Merge a snapshot into the database, or replace the database with it."""
+    if not args.path:
+        raise SystemExit("restore needs the path of a snapshot")
+    
+    summary = restore_database(args.path, args.mode)
+    if args.mode == 'merge':
+        print(
+            f"Merged {summary['entries']} time entries ({summary['duplicates']} duplicates skipped)"
+            f" and created {summary['activities']} activities"
+        )
+    else:
+        print(f"Restored {summary['activities']} activities and {summary['entries']} time entries")
+
+def vacuum(args):
+    """Reclaim free space, converting the database to incremental auto-vacuum first if needed."""
+    if not is_sqlite():
+        reclaim_space()
+        print("Vacuumed the time entry tables")
+        return
+    
+    path = database_path()
+    before = os.path.getsize(path)
+    reclaim_space(convert=True)
+    print(f"Shrank {path} from {before / 1024 / 1024:.1f} MiB to {os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+
+def archive(args):
+    """Move time entries older than the archive horizon to the archive database."""
+    print(f"Archived {archive_time_entries()} time entries")
+
+COMMANDS = {
+    'rebuild': rebuild,
+    'backup': backup,
+    'restore': restore,
+    'archive': archive,
+    'vacuum': vacuum,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="10,000 Hour Tracker database maintenance")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('path', nargs='?', help="snapshot to restore")
+    parser.add_argument('--mode', choices=RESTORE_MODES, default='merge', help="how to restore (default: merge)")
+    parser.add_argument('--user', default=config.DEFAULT_USER_ID, help="user whose data or database to work on")
+    args = parser.parse_args(argv)
+    with user_scope(args.user):
+        COMMANDS[args.command](args)
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,114 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import create_engine, MetaData, Column, Integer, String, Float, Date, DateTime, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import config
 
 Base = declarative_base()
 
+def user_id_column():
+    """Owner of a row. Rows from before users existed belong to the default user."""
+    return Column(String(255), nullable=False, server_default=config.DEFAULT_USER_ID)
+
 class Activity(Base):
     __tablename__ = 'activities'
     
     id = Column(Integer, primary_key=True)
+    user_id = user_id_column()
     name = Column(String(100), nullable=False)
     description = Column(String(500))
     category = Column(String(50))
     is_main = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     color = Column(String(7), default='#3B82F6')
+    
+    __table_args__ = (
+        Index('ix_activities_user_name', 'user_id', 'name'),
+    )
 
 class TimeEntry(Base):
     __tablename__ = 'time_entries'
     
     id = Column(Integer, primary_key=True)
+    user_id = user_id_column()
     activity_id = Column(Integer, nullable=False)
     hours = Column(Float, nullable=False)
     date = Column(DateTime, default=datetime.now)
     notes = Column(String(500))
+    
+    __table_args__ = (
+        Index('ix_time_entries_activity_date', 'user_id', 'activity_id', 'date'),
+        Index('ix_time_entries_date', 'user_id', 'date'),
+        # Never hand out an id again, so it can't collide with an archived entry
+        {'sqlite_autoincrement': True},
+    )
 
 class Milestone(Base):
     __tablename__ = 'milestones'
     
     id = Column(Integer, primary_key=True)
+    user_id = user_id_column()
     activity_id = Column(Integer, nullable=False)
     hours_reached = Column(Integer, nullable=False)
-    reached_at = Column(DateTime, default=datetime.now) 
\ No newline at end of file
+    reached_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        Index('ix_milestones_activity_hours', 'user_id', 'activity_id', 'hours_reached', unique=True),
+    ) 
+
+class DailyRollup(Base):
+    __tablename__ = 'daily_rollups'
+    
+    activity_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    user_id = user_id_column()
+    hours = Column(Float, nullable=False, default=0)
+    sessions = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('ix_daily_rollups_day', 'user_id', 'day'),
+    )
+
+class ActivityTotals(Base):
+    __tablename__ = 'activity_totals'
+    
+    activity_id = Column(Integer, primary_key=True)
+    user_id = user_id_column()
+    total_hours = Column(Float, nullable=False, default=0)
+    session_count = Column(Integer, nullable=False, default=0)
+    first_entry = Column(DateTime)
+    last_entry = Column(DateTime)
+
+class DatabaseState(Base):
+    __tablename__ = 'database_state'
+    
+    id = Column(Integer, primary_key=True)
+    write_generation = Column(Integer, nullable=False, default=0)
+    # Entries before this time may have been moved to the archive
+    archived_before = Column(DateTime)
+
+class UserState(Base):
+    __tablename__ = 'user_state'
+    
+    user_id = Column(String(255), primary_key=True)
+    # Bumped by every write to the user's data; keys the crud read cache
+    write_generation = Column(Integer, nullable=False, default=0)
+
+# Tables in the archive database, which is attached to every connection as
+# ``archive``
+ArchiveBase = declarative_base(metadata=MetaData(schema='archive'))
+
+class ArchivedTimeEntry(ArchiveBase):
+    __tablename__ = 'time_entries'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = user_id_column()
+    activity_id = Column(Integer, nullable=False)
+    hours = Column(Float, nullable=False)
+    date = Column(DateTime, nullable=False)
+    notes = Column(String(500))
+    
+    __table_args__ = (
+        Index('ix_archived_time_entries_activity_date', 'user_id', 'activity_id', 'date'),
+        Index('ix_archived_time_entries_date', 'user_id', 'date'),
+    )
\ No newline at end of file
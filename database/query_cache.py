@@ -0,0 +1,29 @@
+from collections import OrderedDict
+from threading import Lock
+
+class QueryCache:
+    """A thread-safe, size-bounded LRU cache for query results."""
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+    
+    def get(self, key, default=None):
+        """Get a cached value and mark it as recently used."""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries when full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,271 @@
+"""Restore the database from a snapshot, either replacing or merging.
+
+Both modes work on whole tables inside SQLite: replace copies the snapshot
+into the live database with the backup API, merge attaches the snapshot and
+copies rows with INSERT ... SELECT, so a multi-year history is restored
+without going through the ORM row by row.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+from sqlalchemy import MetaData, Table, Column, Integer, Boolean, select, delete, exists, func, literal, text, case, true
+from .models import Activity, TimeEntry, ArchivedTimeEntry, DatabaseState
+from .database import get_engine, init_db, database_path, is_sqlite, DERIVED_TABLES
+from .backup import create_backup
+from .crud import _record_milestones, _bump_write_generation
+from .users import current_user_id
+
+RESTORE_MODES = ('merge', 'replace')
+
+# Tables a snapshot must have to be restored
+REQUIRED_TABLES = {Activity.__tablename__, TimeEntry.__tablename__}
+
+# The snapshot's tables, as seen through ATTACH ... AS source
+_source_metadata = MetaData()
+_source_activities = Activity.__table__.to_metadata(_source_metadata, schema='source')
+_source_entries = TimeEntry.__table__.to_metadata(_source_metadata, schema='source')
+
+# Maps the snapshot's activity ids to this database's during a merge
+_activity_map = Table(
+    'activity_map', MetaData(),
+    Column('source_id', Integer, primary_key=True),
+    Column('target_id', Integer),
+    prefixes=['TEMPORARY']
+)
+
+def _stage_snapshot(snapshot):
+    """Copy a snapshot next to the database, unpacking it if gzipped.
+    
+    ``snapshot`` is a path or a binary file object, e.g. an uploaded file.
+    The copy lives next to the database. Returns the staged path.
+    """
+    staged = database_path() + '.restore'
+    source = open(snapshot, 'rb') if isinstance(snapshot, (str, os.PathLike)) else snapshot
+    try:
+        if source.read(2) == b'\x1f\x8b':
+            source.seek(0)
+            source = gzip.GzipFile(fileobj=source)
+        else:
+            source.seek(0)
+        with open(staged, 'wb') as target:
+            shutil.copyfileobj(source, target, length=1024 * 1024)
+    finally:
+        if source is not snapshot:
+            source.close()
+    
+    try:
+        _check_snapshot(staged)
+    except Exception:
+        _remove_database_files(staged)
+        raise
+    return staged
+
+def _check_snapshot(path):
+    """Raise ValueError unless ``path`` is an intact tracker database."""
+    try:
+        with closing(sqlite3.connect(path)) as connection:
+            tables = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            status = connection.execute("PRAGMA quick_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"not a SQLite database ({e})") from e
+    
+    missing = REQUIRED_TABLES - tables
+    if missing:
+        raise ValueError(f"not a tracker backup, missing tables: {', '.join(sorted(missing))}")
+    if status != 'ok':
+        raise ValueError(f"the backup is damaged: {status}")
+
+def _remove_database_files(path):
+    """Delete a database file together with its WAL and shared-memory files."""
+    for leftover in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+def _counts(connection):
+    """Count the activities and time entries in the database."""
+    return {
+        'activities': connection.execute(select(func.count()).select_from(Activity)).scalar(),
+        'entries': connection.execute(select(func.count()).select_from(TimeEntry)).scalar()
+    }
+
+def _match_page_size(path, page_size):
+    """Rewrite a staged snapshot with the live database's page size.
+    
+    A database in WAL mode cannot change its page size, so the backup API
+    only copies into it from a database with the same page size.
+    """
+    with closing(sqlite3.connect(path)) as connection:
+        if connection.execute("PRAGMA page_size").fetchone()[0] != page_size:
+            connection.execute("PRAGMA journal_mode=DELETE")
+            connection.execute(f"PRAGMA page_size={page_size}")
+            connection.execute("VACUUM")
+
+def replace_database(snapshot):
+    """Replace the whole database with a snapshot.
+    
+    The current database is backed up first. The snapshot is then copied into
+    it with the SQLite backup API, as one write transaction on a live
+    connection, so every other connection (in this process or another)
+    sees either the old or the new data, and none keeps writing to a file
+    that is no longer the database. The archive is emptied. Returns the
+    activity and entry counts of the restored data.
+    """
+    engine = get_engine()
+    staged = _stage_snapshot(snapshot)
+    try:
+        create_backup()
+        with engine.connect() as connection:
+            generation = connection.execute(
+                select(DatabaseState.write_generation).where(DatabaseState.id == 1)
+            ).scalar() or 0
+        
+        with closing(engine.raw_connection()) as live:
+            target = live.driver_connection
+            _match_page_size(staged, target.execute("PRAGMA page_size").fetchone()[0])
+            with closing(sqlite3.connect(staged)) as source:
+                source.backup(target, pages=-1, sleep=0.005)
+    finally:
+        _remove_database_files(staged)
+    
+    # Older snapshots may lack newer tables and indexes
+    init_db(engine)
+    
+    # Snapshots carry their archived entries, so the archive starts over
+    with engine.begin() as connection:
+        connection.execute(delete(ArchivedTimeEntry))
+    
+    with engine.begin() as connection:
+        # Move the generation past the old database's so no cached result
+        # from before the restore is served again
+        connection.execute(
+            DatabaseState.__table__.update()
+            .where(DatabaseState.id == 1)
+            .values(write_generation=DatabaseState.write_generation + generation + 1)
+        )
+        return _counts(connection)
+
+def _has_copy(entries, user_id):
+    """Check whether an entry being merged already exists in ``entries``."""
+    return exists().where(
+        entries.user_id == user_id,
+        entries.activity_id == _activity_map.c.target_id,
+        entries.date == _source_entries.c.date,
+        entries.hours == _source_entries.c.hours,
+        entries.notes.is_not_distinct_from(_source_entries.c.notes)
+    )
+
+def _merge_attached(connection):
+    """Copy the current user's activities and entries from the attached ``source`` database."""
+    user_id = current_user_id()
+    
+    # A snapshot of a shared database holds every user's data, so only the
+    # current user's is merged. Snapshots of one user's data (or from before
+    # there were users) are merged whole, whoever they belonged to.
+    source_columns = {row[1] for row in connection.exec_driver_sql("PRAGMA source.table_info(activities)")}
+    if 'user_id' in source_columns and connection.execute(
+        select(func.count(func.distinct(_source_activities.c.user_id)))
+    ).scalar() > 1:
+        source_activities = _source_activities.c.user_id == user_id
+        source_entries = _source_entries.c.user_id == user_id
+    else:
+        source_activities = source_entries = true()
+    
+    # One activity per new name; it only becomes the main activity if the
+    # user has none yet
+    has_main = exists().where(Activity.user_id == user_id, Activity.is_main.is_(True))
+    created = connection.execute(Activity.__table__.insert().from_select(
+        ['user_id', 'name', 'description', 'category', 'is_main', 'created_at', 'color'],
+        select(
+            literal(user_id),
+            _source_activities.c.name,
+            func.min(_source_activities.c.description),
+            func.min(_source_activities.c.category),
+            case((has_main, literal(False, Boolean)), else_=func.max(_source_activities.c.is_main)),
+            func.min(_source_activities.c.created_at),
+            func.min(_source_activities.c.color)
+        ).where(
+            source_activities,
+            ~exists().where(Activity.user_id == user_id, Activity.name == _source_activities.c.name)
+        ).group_by(_source_activities.c.name)
+    )).rowcount
+    
+    # Source activity id -> the user's first activity with the same name
+    _activity_map.create(connection)
+    connection.execute(_activity_map.insert().from_select(
+        ['source_id', 'target_id'],
+        select(
+            _source_activities.c.id,
+            select(func.min(Activity.id)).where(
+                Activity.user_id == user_id, Activity.name == _source_activities.c.name
+            ).scalar_subquery()
+        ).where(source_activities)
+    ))
+    
+    merged = connection.execute(TimeEntry.__table__.insert().from_select(
+        ['user_id', 'activity_id', 'hours', 'date', 'notes'],
+        select(
+            literal(user_id),
+            _activity_map.c.target_id,
+            _source_entries.c.hours,
+            _source_entries.c.date,
+            _source_entries.c.notes
+        ).join_from(
+            _source_entries, _activity_map, _activity_map.c.source_id == _source_entries.c.activity_id
+        ).where(
+            source_entries,
+            ~_has_copy(TimeEntry, user_id),
+            ~_has_copy(ArchivedTimeEntry, user_id)
+        )
+    )).rowcount
+    total = connection.execute(select(func.count()).select_from(_source_entries).where(source_entries)).scalar()
+    
+    if merged:
+        for rebuild in DERIVED_TABLES.values():
+            rebuild(connection, user_id)
+        _record_milestones(connection, select(_activity_map.c.target_id).distinct())
+    _bump_write_generation(connection)
+    
+    return {'activities': created, 'entries': merged, 'duplicates': total - merged}
+
+def merge_database(snapshot):
+    """Merge the current user's activities and time entries from a snapshot.
+    
+    Activities are matched by name and missing ones are created. Entries are
+    copied with their activity ids remapped, skipping any that already exist,
+    hot or archived, with the same activity, start time, hours and notes. Derived tables and
+    milestones are then rebuilt, all in one transaction. Returns the number
+    of ``activities`` created and of ``entries`` merged and ``duplicates``
+    skipped.
+    """
+    staged = _stage_snapshot(snapshot)
+    try:
+        with get_engine().connect() as connection:
+            # ATTACH is not allowed inside a transaction; pysqlite only
+            # begins one before the first write
+            connection.execute(text("ATTACH DATABASE :path AS source"), {'path': staged})
+            try:
+                summary = _merge_attached(connection)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.execute(text("DROP TABLE IF EXISTS temp.activity_map"))
+                connection.execute(text("DETACH DATABASE source"))
+                connection.commit()
+    finally:
+        _remove_database_files(staged)
+    
+    return summary
+
+def restore_database(snapshot, mode='merge'):
+    """Restore a snapshot in one of ``RESTORE_MODES`` into a SQLite database."""
+    if not is_sqlite():
+        raise RuntimeError("Snapshots can only be restored into a SQLite database")
+    if mode == 'replace':
+        return replace_database(snapshot)
+    if mode == 'merge':
+        return merge_database(snapshot)
+    raise ValueError(f"unknown restore mode: {mode}")
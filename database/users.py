@@ -0,0 +1,50 @@
+"""The user that crud functions act for.
+
+Code that runs outside a Streamlit session (maintenance commands, scripts)
+picks the user with ``user_scope``. Under Streamlit the logged-in user's email
+is used, and without authentication everyone is ``config.DEFAULT_USER_ID``.
+"""
+import hashlib
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import config
+
+_current_user = ContextVar('current_user', default=None)
+
+def current_user_id():
+    """Get the id of the current user."""
+    user_id = _current_user.get()
+    if user_id is not None:
+        return user_id
+    
+    # st.user only has is_logged_in when authentication is configured
+    if get_script_run_ctx(suppress_warning=True) is not None and st.user.get('is_logged_in'):
+        return st.user.get('email') or st.user.get('sub') or config.DEFAULT_USER_ID
+    return config.DEFAULT_USER_ID
+
+@contextmanager
+def user_scope(user_id):
+    """Act for ``user_id`` inside the ``with`` block."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+def user_slug(user_id):
+    """Get a file-name-safe, collision-free name for a user."""
+    readable = re.sub(r'[^A-Za-z0-9_.-]+', '_', user_id).strip('._')[:40]
+    digest = hashlib.blake2b(user_id.encode(), digest_size=4).hexdigest()
+    return f"{readable}-{digest}"
+
+def owns_database():
+    """Check whether the current user is the only one in their database.
+    
+    True with one database per user, or for the default user when everyone
+    shares the database. Whole-database operations such as backups and
+    replacing the database are limited to such users.
+    """
+    return config.DB_PER_USER or current_user_id() == config.DEFAULT_USER_ID
@@ -0,0 +1,154 @@
+"""Background writer for time entries logged from the UI.
+
+The timer, Pomodoro and quick entries hand their time entries to one writer
+thread per process instead of committing on the script thread, so a page
+never hangs on a locked database. Whatever has queued up by the time the
+writer gets to it is committed together, in one transaction per user, and a
+commit that finds the database busy is retried. Every entry gets a future
+that resolves once the entry is committed. Queued entries are flushed when
+the process exits.
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+import streamlit as st
+from streamlit import runtime
+import config
+from .crud import add_time_entries
+from .users import current_user_id, user_scope
+
+# Queued after the last entry to stop the writer
+_STOP = object()
+
+def _is_busy(error):
+    """Check whether a commit failed only because the database was busy."""
+    code = getattr(error.orig, 'sqlite_errorcode', None)
+    if code is not None:
+        # Extended codes such as SQLITE_BUSY_SNAPSHOT keep the primary code
+        # in the low byte
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    # PostgreSQL serialization failures and deadlocks
+    return getattr(error.orig, 'pgcode', None) in ('40001', '40P01')
+
+class WriteQueue:
+    """A bounded queue of time entries drained by one writer thread.
+    
+    ``submit`` blocks while ``maxsize`` entries are waiting. The writer takes
+    up to ``batch_size`` entries at a time and retries a busy commit up to
+    ``retries`` times, sleeping ``retry_delay`` seconds and doubling.
+    """
+    
+    def __init__(self, maxsize, batch_size, retries, retry_delay):
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+    
+    def submit(self, user_id, entry):
+        """Queue a time entry of ``user_id`` and return the future of its commit.
+        
+        ``entry`` is a dict with the arguments of ``add_time_entry``. The
+        future's result is True once the entry is committed; if writing it
+        failed, the future holds the error.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The write queue is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tracker-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((user_id, entry, future))
+        return future
+    
+    def close(self, timeout=None):
+        """Stop taking entries and wait until every queued one is written."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+    
+    def _run(self):
+        """Write queued entries until the queue is closed."""
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Everything that queued up meanwhile goes into the same commit
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                batch.remove(_STOP)
+                stopping = True
+            
+            by_user = {}
+            for user_id, entry, future in batch:
+                if future.set_running_or_notify_cancel():
+                    by_user.setdefault(user_id, []).append((entry, future))
+            for user_id, items in by_user.items():
+                with user_scope(user_id):
+                    self._write(items)
+    
+    def _write(self, items):
+        """Commit one user's entries together and resolve their futures."""
+        try:
+            self._with_retries(lambda: add_time_entries([entry for entry, _ in items]))
+        except Exception as error:
+            if len(items) > 1:
+                # Don't let one bad entry fail the others
+                for item in items:
+                    self._write([item])
+                return
+            items[0][1].set_exception(error)
+        else:
+            for _, future in items:
+                future.set_result(True)
+    
+    def _with_retries(self, write):
+        """Run a write, retrying it while the database is busy."""
+        for attempt in range(self.retries + 1):
+            try:
+                return write()
+            except OperationalError as error:
+                if attempt == self.retries or not _is_busy(error):
+                    raise
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+def _create_write_queue():
+    """Create the process's write queue and flush it when the process exits."""
+    write_queue = WriteQueue(
+        config.WRITE_QUEUE_SIZE,
+        config.WRITE_BATCH_SIZE,
+        config.WRITE_RETRIES,
+        config.WRITE_RETRY_DELAY_MS / 1000
+    )
+    atexit.register(write_queue.close)
+    return write_queue
+
+# Under Streamlit the queue is cached as a resource, so every session and
+# script rerun in the process shares the one writer
+write_queue = (st.cache_resource(_create_write_queue) if runtime.exists() else _create_write_queue)()
+
+def queue_time_entry(activity_id, hours, date=None, notes=""):
+    """Queue a time entry for the current user; returns the future of its commit."""
+    return write_queue.submit(current_user_id(), {
+        'activity_id': activity_id,
+        'hours': hours,
+        # The entry is dated when it is logged, not when it is written
+        'date': date or datetime.now(),
+        'notes': notes
+    })
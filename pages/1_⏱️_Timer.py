@@ -1,9 +1,9 @@
 import streamlit as st
-import time
 from datetime import datetime, timedelta
 import pandas as pd
-from database.crud import get_activities, add_time_entry, get_activity_names
+from database.crud import get_activities, get_activity_names, read_scope
 from components.timer import timer
+from components.write_status import save_time_entry, show_write_status
 from utils.time_helpers import parse_time_input, format_duration
 
 # Page config
@@ -23,8 +23,11 @@ except:
 st.title("⏱️ Timer")
 st.markdown("Track your time with precision and flexibility")
 
+show_write_status()
+
 # Get activities
-activities = get_activities()
+with read_scope():
+    activities = get_activities()
 
 if not activities:
     st.warning("⚠️ No activities found. Please add an activity from the main page first.")
@@ -53,36 +56,41 @@ if timer.is_running():
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            elapsed = timer.get_elapsed_time()
-            time_details = timer.format_time_detailed(elapsed)
-            
-            status = "⏸️ PAUSED" if st.session_state.get('is_paused', False) else "⏱️ RUNNING"
-            status_class = "paused" if st.session_state.get('is_paused', False) else "running"
-            
-            st.markdown(f"""
-                <div class="timer-display {status_class}">
-                    <div class="timer-status">{status}</div>
-                    <div style="display: flex; justify-content: center; align-items: baseline; gap: 1rem; margin: 1rem 0;">
-                        <div style="text-align: center;">
-                            <div style="font-size: 3rem; font-weight: 700; color: var(--primary-color); font-family: 'Monaco', monospace;">{time_details['hours']:02d}</div>
-                            <div style="font-size: 0.875rem; color: var(--text-secondary); text-transform: uppercase; letter-spacing: 1px;">Hours</div>
-                        </div>
-                        <div style="font-size: 2rem; color: var(--text-secondary); margin: 0 0.5rem;">:</div>
-                        <div style="text-align: center;">
-                            <div style="font-size: 3rem; font-weight: 700; color: var(--primary-color); font-family: 'Monaco', monospace;">{time_details['minutes']:02d}</div>
-                            <div style="font-size: 0.875rem; color: var(--text-secondary); text-transform: uppercase; letter-spacing: 1px;">Minutes</div>
+            # Only this fragment reruns each second while the timer is running
+            @st.fragment(run_every=None if st.session_state.get('is_paused', False) else 1)
+            def live_timer():
+                elapsed = timer.get_elapsed_time()
+                time_details = timer.format_time_detailed(elapsed)
+                
+                status = "⏸️ PAUSED" if st.session_state.get('is_paused', False) else "⏱️ RUNNING"
+                status_class = "paused" if st.session_state.get('is_paused', False) else "running"
+                
+                st.markdown(f"""
+                    <div class="timer-display {status_class}">
+                        <div class="timer-status">{status}</div>
+                        <div style="display: flex; justify-content: center; align-items: baseline; gap: 1rem; margin: 1rem 0;">
+                            <div style="text-align: center;">
+                                <div style="font-size: 3rem; font-weight: 700; color: var(--primary-color); font-family: 'Monaco', monospace;">{time_details['hours']:02d}</div>
+                                <div style="font-size: 0.875rem; color: var(--text-secondary); text-transform: uppercase; letter-spacing: 1px;">Hours</div>
+                            </div>
+                            <div style="font-size: 2rem; color: var(--text-secondary); margin: 0 0.5rem;">:</div>
+                            <div style="text-align: center;">
+                                <div style="font-size: 3rem; font-weight: 700; color: var(--primary-color); font-family: 'Monaco', monospace;">{time_details['minutes']:02d}</div>
+                                <div style="font-size: 0.875rem; color: var(--text-secondary); text-transform: uppercase; letter-spacing: 1px;">Minutes</div>
+                            </div>
+                            <div style="font-size: 2rem; color: var(--text-secondary); margin: 0 0.5rem;">:</div>
+                            <div style="text-align: center;">
+                                <div style="font-size: 3rem; font-weight: 700; color: var(--primary-color); font-family: 'Monaco', monospace;">{time_details['seconds']:02d}</div>
+                                <div style="font-size: 0.875rem; color: var(--text-secondary); text-transform: uppercase; letter-spacing: 1px;">Seconds</div>
+                            </div>
                         </div>
-                        <div style="font-size: 2rem; color: var(--text-secondary); margin: 0 0.5rem;">:</div>
-                        <div style="text-align: center;">
-                            <div style="font-size: 3rem; font-weight: 700; color: var(--primary-color); font-family: 'Monaco', monospace;">{time_details['seconds']:02d}</div>
-                            <div style="font-size: 0.875rem; color: var(--text-secondary); text-transform: uppercase; letter-spacing: 1px;">Seconds</div>
+                        <div style="margin-top: 1rem;">
+                            <div style="font-size: 1.25rem; color: var(--text-secondary);">Total: {time_details['formatted']}</div>
                         </div>
                     </div>
-                    <div style="margin-top: 1rem;">
-                        <div style="font-size: 1.25rem; color: var(--text-secondary);">Total: {time_details['formatted']}</div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
+            
+            live_timer()
         
         with col2:
             # Timer controls
@@ -105,11 +113,6 @@ if timer.is_running():
                     st.rerun()
                 else:
                     st.error("❌ Failed to stop timer")
-        
-        # Auto-refresh for running timer
-        if not st.session_state.get('is_paused', False):
-            time.sleep(1)
-            st.rerun()
     
 else:
     # Start new timer
@@ -181,18 +184,19 @@ with st.form("manual_entry"):
                     break
             
             if activity_id:
-                success = add_time_entry(
+                success = save_time_entry(
+                    f"{hours:.2f}h of {selected_activity}",
                     activity_id=activity_id,
                     hours=hours,
                     date=datetime.combine(date, datetime.min.time()),
                     notes=notes
                 )
                 
-                if success:
+                if success is False:
+                    st.error("❌ Failed to add time entry")
+                else:
                     st.success(f"✅ Added {hours:.2f} hours to {selected_activity}")
                     st.rerun()
-                else:
-                    st.error("❌ Failed to add time entry")
         else:
             st.error("❌ Please enter a valid time amount")
 
@@ -278,7 +282,8 @@ if st.session_state.get('pomodoro_running', False):
                         break
                 
                 if activity_id:
-                    add_time_entry(
+                    save_time_entry(
+                        f"{total_work_hours:.2f}h of {st.session_state.pomodoro_activity}",
                         activity_id=activity_id,
                         hours=total_work_hours,
                         date=datetime.now(),
@@ -299,24 +304,34 @@ if st.session_state.get('pomodoro_running', False):
             st.rerun()
     else:
         # Display timer
-        minutes_remaining = int(remaining_seconds // 60)
-        seconds_remaining = int(remaining_seconds % 60)
-        
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            # Progress bar
-            progress = (total_time - remaining_seconds) / total_time
-            st.progress(progress)
-            
-            # Time display
-            if is_break:
-                st.markdown(f"### 🛌 Break Time: {minutes_remaining:02d}:{seconds_remaining:02d}")
-            else:
-                st.markdown(f"### 💪 Work Time: {minutes_remaining:02d}:{seconds_remaining:02d}")
+            # Only this fragment reruns each second; the page reruns once the
+            # session is over so the completion logic above can run
+            @st.fragment(run_every=1)
+            def pomodoro_clock():
+                remaining_seconds = total_time - (datetime.now() - st.session_state.pomodoro_start_time).total_seconds()
+                if remaining_seconds <= 0:
+                    st.rerun()
+                
+                minutes_remaining = int(remaining_seconds // 60)
+                seconds_remaining = int(remaining_seconds % 60)
+                
+                # Progress bar
+                progress = (total_time - remaining_seconds) / total_time
+                st.progress(progress)
+                
+                # Time display
+                if is_break:
+                    st.markdown(f"### 🛌 Break Time: {minutes_remaining:02d}:{seconds_remaining:02d}")
+                else:
+                    st.markdown(f"### 💪 Work Time: {minutes_remaining:02d}:{seconds_remaining:02d}")
+                
+                st.markdown(f"**Session {current_session} of {total_sessions}**")
+                st.markdown(f"**Activity:** {st.session_state.pomodoro_activity}")
             
-            st.markdown(f"**Session {current_session} of {total_sessions}**")
-            st.markdown(f"**Activity:** {st.session_state.pomodoro_activity}")
+            pomodoro_clock()
         
         with col2:
             if st.button("⏹️ Stop Pomodoro", use_container_width=True):
@@ -333,7 +348,8 @@ if st.session_state.get('pomodoro_running', False):
                             break
                     
                     if activity_id and work_hours > 0:
-                        add_time_entry(
+                        save_time_entry(
+                            f"{work_hours:.2f}h of {st.session_state.pomodoro_activity}",
                             activity_id=activity_id,
                             hours=work_hours,
                             date=datetime.now(),
@@ -343,10 +359,6 @@ if st.session_state.get('pomodoro_running', False):
                 st.session_state.pomodoro_running = False
                 st.success("Pomodoro stopped")
                 st.rerun()
-        
-        # Auto-refresh
-        time.sleep(1)
-        st.rerun()
 
 # Quick time entries
 st.markdown("---")
@@ -388,19 +400,20 @@ if st.session_state.get('show_quick_entry', False):
                         break
                 
                 if activity_id:
-                    success = add_time_entry(
+                    success = save_time_entry(
+                        f"{st.session_state.quick_time}h of {quick_activity}",
                         activity_id=activity_id,
                         hours=st.session_state.quick_time,
                         date=datetime.combine(quick_date, datetime.min.time()),
                         notes=quick_notes
                     )
                     
-                    if success:
+                    if success is False:
+                        st.error("❌ Failed to add time entry")
+                    else:
                         st.success(f"✅ Added {st.session_state.quick_time} hours to {quick_activity}")
                         st.session_state.show_quick_entry = False
                         st.rerun()
-                    else:
-                        st.error("❌ Failed to add time entry")
         
         with col_cancel:
             if st.form_submit_button("Cancel"):
@@ -3,7 +3,9 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from database.crud import get_activities, get_time_entries_df, get_main_activity
+from database.crud import get_activities, get_recent_time_entries, get_daily_hours_df, get_series, get_main_activity, read_scope
+from database.export import EXPORT_FORMATS, export_time_entries, export_mime_type
+from database.users import current_user_id
 from components.charts import (
     create_daily_hours_chart,
     create_activity_breakdown_chart,
@@ -13,7 +15,8 @@ from components.charts import (
     create_hourly_distribution_chart,
     create_activity_comparison_chart,
     create_milestone_progress_chart,
-    create_streak_chart
+    create_streak_chart,
+    figure_payload_size
 )
 from utils.time_helpers import (
     get_time_period_bounds,
@@ -22,6 +25,7 @@ from utils.time_helpers import (
     get_consistency_score,
     calculate_velocity
 )
+from config import CHART_MAX_POINTS
 
 st.set_page_config(
     page_title="Statistics - 10,000 Hour Tracker",
@@ -38,8 +42,9 @@ except:
 st.title("📊 Statistics")
 st.markdown("Analyze your progress and identify patterns in your learning journey")
 
-activities = get_activities()
-main_activity = get_main_activity()
+with read_scope():
+    activities = get_activities()
+    main_activity = get_main_activity()
 
 if not activities:
     st.warning("⚠️ No activities found. Please add an activity from the main page first.")
@@ -89,29 +94,37 @@ with col3:
     else:
         end_date = None
 
+lightweight_charts = st.toggle(
+    "⚡ Lightweight charts",
+    help=f"Downsample time series to {CHART_MAX_POINTS:,} points and draw long ones with WebGL. Useful on phones and for long ranges."
+)
+max_points = CHART_MAX_POINTS if lightweight_charts else None
+
 if use_custom_range and start_date and end_date:
-    df = get_time_entries_df(start_date, end_date)
+    range_start, range_end = start_date, end_date
 elif selected_period == "all_time":
-    df = get_time_entries_df()
+    range_start, range_end = None, None
 else:
-    period_start, period_end = get_time_period_bounds(selected_period)
-    df = get_time_entries_df(period_start, period_end)
+    range_start, range_end = get_time_period_bounds(selected_period)
 
-if not df.empty:
-    df['date'] = pd.to_datetime(df['date'])
+# Per-day sums come from the rollup table and every chart shares one set of
+# aggregates; raw entries are only read for recent sessions and export
+with read_scope():
+    daily_df = get_daily_hours_df(range_start, range_end)
+    series = get_series(range_start, range_end)
 
 st.markdown("---")
 st.subheader("📈 Overview")
 
-if not df.empty:
-    total_hours = df['hours'].sum()
-    total_sessions = len(df)
-    active_days = df['date'].nunique()
+if not daily_df.empty:
+    total_hours = series.daily['hours'].sum()
+    total_sessions = int(series.daily['sessions'].sum())
+    active_days = len(series.daily)
     daily_average = total_hours / active_days if active_days > 0 else 0
     
-    best_day_stats = get_best_day_stats(df)
-    consistency = get_consistency_score(df)
-    velocity = calculate_velocity(df)
+    best_day_stats = get_best_day_stats(series)
+    consistency = get_consistency_score(series)
+    velocity = calculate_velocity(series)
     
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -179,7 +192,7 @@ if not df.empty:
 else:
     st.info("📊 No data available for the selected time period.")
 
-if not df.empty:
+if not daily_df.empty:
     st.markdown("---")
     st.subheader("📊 Charts & Visualizations")
     
@@ -187,20 +200,24 @@ if not df.empty:
     
     with tab1:
         st.markdown("#### Daily Hours Over Time")
-        daily_chart = create_daily_hours_chart(df)
+        daily_chart = create_daily_hours_chart(series, max_points)
         st.plotly_chart(daily_chart, use_container_width=True, key="daily_hours_chart")
+        if lightweight_charts:
+            st.caption(f"Chart payload: {figure_payload_size(daily_chart) / 1024:.1f} KiB")
         
         st.markdown("#### Weekly Hours")
-        weekly_chart = create_weekly_hours_chart(df)
+        weekly_chart = create_weekly_hours_chart(series)
         st.plotly_chart(weekly_chart, use_container_width=True, key="weekly_hours_chart")
         
         st.markdown("#### Cumulative Progress")
-        progress_chart = create_progress_over_time_chart(df)
+        progress_chart = create_progress_over_time_chart(series, max_points)
         st.plotly_chart(progress_chart, use_container_width=True, key="progress_over_time_chart")
+        if lightweight_charts:
+            st.caption(f"Chart payload: {figure_payload_size(progress_chart) / 1024:.1f} KiB")
     
     with tab2:
         st.markdown("#### Activity Breakdown")
-        breakdown_chart = create_activity_breakdown_chart(df)
+        breakdown_chart = create_activity_breakdown_chart(series)
         st.plotly_chart(breakdown_chart, use_container_width=True, key="activity_breakdown_chart")
         
         st.markdown("#### Activity Comparison")
@@ -208,16 +225,16 @@ if not df.empty:
         st.plotly_chart(comparison_chart, use_container_width=True, key="activity_comparison_chart_stats")
         
         st.markdown("#### Hourly Distribution")
-        hourly_chart = create_hourly_distribution_chart(df)
+        hourly_chart = create_hourly_distribution_chart(series)
         st.plotly_chart(hourly_chart, use_container_width=True, key="hourly_distribution_chart")
     
     with tab3:
         st.markdown("#### Activity Heatmap")
-        heatmap_chart = create_calendar_heatmap(df)
+        heatmap_chart = create_calendar_heatmap(series, range_start, range_end)
         st.plotly_chart(heatmap_chart, use_container_width=True, key="calendar_heatmap_chart")
         
         st.markdown("#### Streak Analysis")
-        streak_chart = create_streak_chart(df)
+        streak_chart = create_streak_chart(series)
         st.plotly_chart(streak_chart, use_container_width=True, key="streak_analysis_chart")
     
     with tab4:
@@ -284,14 +301,15 @@ if activities:
         with col4:
             st.metric("Streak", f"{selected_activity_data['streak']} days")
         
-        activity_df = df[df['activity_name'] == selected_activity]
+        activity_daily_df = daily_df[daily_df['activity_name'] == selected_activity]
+        recent_sessions = get_recent_time_entries(selected_activity_data['id'], 10, range_start, range_end)
         
-        if not activity_df.empty:
+        if not activity_daily_df.empty:
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown("##### Daily Hours")
-                daily_hours = activity_df.groupby('date')['hours'].sum().reset_index()
+                daily_hours = activity_daily_df
                 
                 fig = px.line(
                     daily_hours,
@@ -315,9 +333,8 @@ if activities:
                 )
                 st.plotly_chart(progress_ring, use_container_width=True, key=f"progress_ring_stats_{selected_activity}")
         
-        if not activity_df.empty:
+        if not recent_sessions.empty:
             st.markdown("##### Recent Sessions")
-            recent_sessions = activity_df.tail(10).sort_values('date', ascending=False)
             
             display_sessions = recent_sessions[['date', 'hours', 'notes']].copy()
             display_sessions['date'] = display_sessions['date'].dt.strftime('%Y-%m-%d')
@@ -332,38 +349,40 @@ st.subheader("💾 Export Data")
 col1, col2 = st.columns(2)
 
 with col1:
-    if st.button("📥 Download CSV", use_container_width=True):
-        if not df.empty:
-            csv = df.to_csv(index=False)
-            st.download_button(
-                label="Download Time Entries",
-                data=csv,
-                file_name=f"time_entries_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
-            )
-        else:
-            st.error("No data to export")
+    export_format = st.selectbox("Export Format", list(EXPORT_FORMATS), format_func=str.upper)
+    
+    # The export is only written when the button is clicked, on a thread
+    # that doesn't know the logged-in user, so pass the user along
+    user_id = current_user_id()
+    st.download_button(
+        label="📥 Download Time Entries",
+        data=lambda: export_time_entries(export_format, range_start, range_end, user_id=user_id),
+        file_name=f"time_entries_{datetime.now().strftime('%Y%m%d')}.{export_format}",
+        mime=export_mime_type(export_format),
+        disabled=daily_df.empty,
+        use_container_width=True
+    )
 
 with col2:
     if st.button("📊 Generate Report", use_container_width=True):
-        if not df.empty:
+        if not daily_df.empty:
             report_text = f"""
 10,000 Hour Tracker Report
 Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 OVERVIEW
 ========
-Total Hours: {df['hours'].sum():.1f}h
-Total Sessions: {len(df):,}
-Active Days: {df['date'].nunique():,}
-Daily Average: {df['hours'].sum() / df['date'].nunique():.1f}h
+Total Hours: {series.daily['hours'].sum():.1f}h
+Total Sessions: {int(series.daily['sessions'].sum()):,}
+Active Days: {len(series.daily):,}
+Daily Average: {series.daily['hours'].sum() / len(series.daily):.1f}h
 
 ACTIVITY BREAKDOWN
 ==================
 """
             
-            activity_summary = df.groupby('activity_name')['hours'].sum().sort_values(ascending=False)
-            for activity, hours in activity_summary.items():
+            activity_summary = series.by_activity.sort_values('hours', ascending=False)
+            for activity, hours in zip(activity_summary['activity_name'], activity_summary['hours']):
                 report_text += f"{activity}: {hours:.1f}h\n"
             
             st.download_button(
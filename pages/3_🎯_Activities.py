@@ -6,11 +6,14 @@ from database.crud import (
     add_activity, 
     update_activity, 
     delete_activity,
-    get_time_entries_df,
-    get_milestones
+    get_recent_time_entries,
+    get_daily_hours_df,
+    get_milestones,
+    read_scope
 )
 from components.progress_ring import create_mini_progress_ring, create_progress_ring
 from utils.time_helpers import format_duration, estimate_completion_date
+from config import MILESTONE_HOURS
 
 # Page config
 st.set_page_config(
@@ -30,7 +33,8 @@ st.title("🎯 Activities")
 st.markdown("Manage your learning activities and track your progress towards mastery")
 
 # Get activities
-activities = get_activities()
+with read_scope():
+    activities = get_activities()
 
 # Add new activity section
 st.markdown("---")
@@ -282,7 +286,7 @@ else:
         # Milestones
         st.markdown("#### 🏆 Milestones")
         
-        milestones = [100, 500, 1000, 2500, 5000, 7500, 10000]
+        milestones = MILESTONE_HOURS
         current_hours = selected_activity['total_hours']
         
         milestone_cols = st.columns(len(milestones))
@@ -299,50 +303,41 @@ else:
         # Recent activity
         st.markdown("#### 📈 Recent Activity")
         
-        # Get recent time entries for this activity
-        recent_df = get_time_entries_df()
+        # Get the 10 newest time entries for this activity
+        recent_entries = get_recent_time_entries(selected_activity['id'], 10)
         
-        if not recent_df.empty:
-            activity_df = recent_df[recent_df['activity_name'] == selected_activity['name']]
+        if not recent_entries.empty:
+            # Format for display
+            display_entries = recent_entries[['date', 'hours', 'notes']].copy()
+            display_entries['date'] = pd.to_datetime(display_entries['date']).dt.strftime('%Y-%m-%d')
+            display_entries['hours'] = display_entries['hours'].apply(lambda x: f"{x:.2f}h")
+            display_entries.columns = ['Date', 'Hours', 'Notes']
             
-            if not activity_df.empty:
-                # Show recent 10 entries
-                recent_entries = activity_df.tail(10).sort_values('date', ascending=False)
-                
-                # Format for display
-                display_entries = recent_entries[['date', 'hours', 'notes']].copy()
-                display_entries['date'] = pd.to_datetime(display_entries['date']).dt.strftime('%Y-%m-%d')
-                display_entries['hours'] = display_entries['hours'].apply(lambda x: f"{x:.2f}h")
-                display_entries.columns = ['Date', 'Hours', 'Notes']
-                
-                st.dataframe(display_entries, use_container_width=True, hide_index=True)
-                
-                # Activity timeline chart
-                st.markdown("#### 📊 Activity Timeline")
-                
-                # Group by date and sum hours
-                daily_hours = activity_df.groupby('date')['hours'].sum().reset_index()
-                daily_hours['date'] = pd.to_datetime(daily_hours['date'])
-                
-                import plotly.express as px
-                
-                fig = px.line(
-                    daily_hours,
-                    x='date',
-                    y='hours',
-                    title=f'{selected_activity["name"]} - Daily Hours',
-                    markers=True
-                )
-                
-                fig.update_traces(line_color=selected_activity['color'])
-                fig.update_layout(
-                    height=400,
-                    showlegend=False
-                )
-                
-                st.plotly_chart(fig, use_container_width=True, key=f"timeline_chart_{selected_activity['id']}")
-            else:
-                st.info(f"No time entries found for {selected_activity['name']}")
+            st.dataframe(display_entries, use_container_width=True, hide_index=True)
+            
+            # Activity timeline chart
+            st.markdown("#### 📊 Activity Timeline")
+            
+            # Hours per day come from the rollup table
+            daily_hours = get_daily_hours_df(activity_id=selected_activity['id'])
+            
+            import plotly.express as px
+            
+            fig = px.line(
+                daily_hours,
+                x='date',
+                y='hours',
+                title=f'{selected_activity["name"]} - Daily Hours',
+                markers=True
+            )
+            
+            fig.update_traces(line_color=selected_activity['color'])
+            fig.update_layout(
+                height=400,
+                showlegend=False
+            )
+            
+            st.plotly_chart(fig, use_container_width=True, key=f"timeline_chart_{selected_activity['id']}")
         else:
             st.info("No time entries found")
 
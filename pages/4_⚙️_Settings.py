@@ -1,8 +1,16 @@
 import streamlit as st
 import pandas as pd
 import os
+from sqlalchemy.exc import OperationalError
+from pathlib import Path
 from datetime import datetime
-from database.crud import get_activities, get_time_entries_df
+from database.crud import get_activities, read_scope, clear_time_entries, reset_all_data
+from database.export import EXPORT_FORMATS, export_time_entries, export_mime_type
+from database.importer import import_time_entries
+from database.backup import create_backup, latest_backup
+from database.restore import RESTORE_MODES, restore_database
+from database.database import is_sqlite, reclaim_space
+from database.users import current_user_id, owns_database
 
 # Page config
 st.set_page_config(
@@ -78,8 +86,10 @@ st.markdown("---")
 st.subheader("📊 Data Management")
 
 # Database statistics
-activities = get_activities()
-df = get_time_entries_df()
+with read_scope():
+    activities = get_activities()
+total_entries = sum(activity['session_count'] for activity in activities)
+total_hours = sum(activity['total_hours'] for activity in activities)
 
 col1, col2, col3 = st.columns(3)
 
@@ -87,11 +97,11 @@ with col1:
     st.metric("Total Activities", len(activities))
 
 with col2:
-    st.metric("Total Time Entries", len(df))
+    st.metric("Total Time Entries", total_entries)
 
 with col3:
-    if not df.empty:
-        st.metric("Total Hours Tracked", f"{df['hours'].sum():.1f}h")
+    if total_entries:
+        st.metric("Total Hours Tracked", f"{total_hours:.1f}h")
     else:
         st.metric("Total Hours Tracked", "0h")
 
@@ -101,52 +111,106 @@ st.markdown("#### 📥 Export Data")
 col1, col2 = st.columns(2)
 
 with col1:
-    if st.button("Export All Data", use_container_width=True):
-        if not df.empty:
-            # Create comprehensive export
-            export_data = df.copy()
-            
-            # Add activity details
-            activity_dict = {activity['id']: activity for activity in activities}
-            export_data['activity_category'] = export_data['activity_id'].map(
-                lambda x: activity_dict.get(x, {}).get('category', '')
-            )
-            export_data['activity_description'] = export_data['activity_id'].map(
-                lambda x: activity_dict.get(x, {}).get('description', '')
-            )
-            
-            csv = export_data.to_csv(index=False)
-            
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name=f"10k_tracker_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
-        else:
-            st.error("No data to export")
+    export_format = st.selectbox("Export Format", list(EXPORT_FORMATS), format_func=str.upper)
+    
+    # The export is only written when the button is clicked, on a thread
+    # that doesn't know the logged-in user, so pass the user along
+    user_id = current_user_id()
+    st.download_button(
+        label="Export All Data",
+        data=lambda: export_time_entries(export_format, user_id=user_id),
+        file_name=f"10k_tracker_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}",
+        mime=export_mime_type(export_format),
+        disabled=not total_entries,
+        use_container_width=True
+    )
+
+# Snapshots hold the whole SQLite database, so only its owner may take them
+can_snapshot = is_sqlite() and owns_database()
 
 with col2:
-    if st.button("Backup Database", use_container_width=True):
-        # Check if database file exists
-        if os.path.exists("tracker.db"):
-            with open("tracker.db", "rb") as f:
-                st.download_button(
-                    label="Download Database",
-                    data=f.read(),
-                    file_name=f"tracker_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db",
-                    mime="application/octet-stream"
-                )
-        else:
-            st.error("Database file not found")
+    if can_snapshot and st.button("Backup Database", use_container_width=True):
+        backup_path = create_backup()
+        st.success(f"✅ Saved snapshot {os.path.basename(backup_path)}")
+    
+    backup_path = latest_backup() if can_snapshot else None
+    if backup_path:
+        st.download_button(
+            label="Download Latest Backup",
+            data=lambda: Path(backup_path).read_bytes(),
+            file_name=os.path.basename(backup_path),
+            mime="application/gzip" if backup_path.endswith('.gz') else "application/octet-stream",
+            use_container_width=True
+        )
 
 # Import data
 st.markdown("#### 📤 Import Data")
 
-uploaded_file = st.file_uploader("Upload CSV file", type=['csv'])
+uploaded_file = st.file_uploader(
+    "Upload CSV file",
+    type=['csv'],
+    help="Needs 'activity_name' (or 'activity_id') and 'hours' columns, plus 'timestamp' or 'date' and optional 'notes'. Files from Export All Data work as-is."
+)
 
 if uploaded_file is not None:
-    st.warning("⚠️ Import functionality is not yet implemented. This feature will be added in a future update.")
+    if st.button("Import Time Entries", use_container_width=True, type="primary"):
+        progress_bar = st.progress(0.0, text="Importing...")
+        
+        try:
+            summary = import_time_entries(
+                uploaded_file,
+                progress=lambda fraction, rows: progress_bar.progress(fraction, text=f"Processed {rows:,} rows")
+            )
+        except ValueError as e:
+            st.error(f"❌ Could not import the file: {e}")
+        else:
+            st.success(
+                f"✅ Imported {summary['inserted']:,} time entries"
+                f" ({summary['duplicates']:,} duplicates skipped,"
+                f" {summary['created_activities']:,} new activities)"
+            )
+            
+            if summary['rejected']:
+                st.warning(f"⚠️ {summary['rejected']:,} rows were rejected")
+                st.dataframe(summary['rejected_rows'], use_container_width=True, hide_index=True)
+
+# Restore from a backup (snapshots are SQLite files)
+if is_sqlite():
+    st.markdown("#### ♻️ Restore Backup")
+    
+    backup_file = st.file_uploader(
+        "Upload backup file",
+        type=['db', 'gz'],
+        help="A snapshot from Backup Database, gzipped or not."
+    )
+    
+    restore_mode = st.radio(
+        "Restore Mode",
+        RESTORE_MODES if can_snapshot else ['merge'],
+        format_func=lambda mode: {
+            'merge': "Merge into current data",
+            'replace': "Replace all current data"
+        }[mode],
+        horizontal=True,
+        help="Merge adds the backup's activities and time entries, skipping ones you already have. Replace swaps in the backup as it is, after saving a snapshot of the current database."
+    )
+    
+    if backup_file is not None:
+        if st.button("Restore Backup", use_container_width=True, type="primary"):
+            try:
+                with st.spinner("Restoring..."):
+                    summary = restore_database(backup_file, restore_mode)
+            except ValueError as e:
+                st.error(f"❌ Could not restore the backup: {e}")
+            else:
+                if restore_mode == 'merge':
+                    st.success(
+                        f"✅ Merged {summary['entries']:,} time entries"
+                        f" ({summary['duplicates']:,} duplicates skipped,"
+                        f" {summary['activities']:,} new activities)"
+                    )
+                else:
+                    st.success(f"✅ Restored {summary['activities']:,} activities and {summary['entries']:,} time entries")
 
 # Danger zone
 st.markdown("---")
@@ -173,10 +237,19 @@ if st.session_state.get('show_clear_entries_confirm', False):
     
     with col1:
         if st.button("Yes, Clear All Entries", type="primary"):
-            # Implementation would go here
-            st.success("All time entries have been cleared.")
+            with st.spinner("Clearing time entries..."):
+                deleted = clear_time_entries()
             st.session_state.show_clear_entries_confirm = False
-            st.rerun()
+            
+            # The entries are gone either way; only report a failure to shrink the file
+            try:
+                with st.spinner("Reclaiming space..."):
+                    reclaim_space()
+            except OperationalError as e:
+                st.warning(f"⚠️ All {deleted:,} time entries were cleared, but the freed space could not be reclaimed yet: {e.orig}")
+            else:
+                st.success(f"All {deleted:,} time entries have been cleared.")
+                st.rerun()
     
     with col2:
         if st.button("Cancel"):
@@ -191,10 +264,18 @@ if st.session_state.get('show_reset_confirm', False):
     
     with col1:
         if st.button("Yes, Reset Everything", type="primary"):
-            # Implementation would go here
-            st.success("All data has been reset.")
+            with st.spinner("Resetting all data..."):
+                reset_all_data()
             st.session_state.show_reset_confirm = False
-            st.rerun()
+            
+            try:
+                with st.spinner("Reclaiming space..."):
+                    reclaim_space()
+            except OperationalError as e:
+                st.warning(f"⚠️ All data was reset, but the freed space could not be reclaimed yet: {e.orig}")
+            else:
+                st.success("All data has been reset.")
+                st.rerun()
     
     with col2:
         if st.button("Cancel"):
@@ -0,0 +1,29 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# The database is opened when the package is imported, so point it at a
+# scratch directory first
+_directory = tempfile.mkdtemp()
+os.environ['TRACKER_DB_PATH'] = os.path.join(_directory, 'tracker.db')
+os.environ['TRACKER_ARCHIVE_PATH'] = os.path.join(_directory, 'tracker_archive.db')
+
+from database import crud
+from database.database import reclaim_space, get_engine
+
+def test_clear_then_reclaim_shrinks_the_file():
+    activity_id = crud.add_activity("Piano")
+    now = datetime.now()
+    crud.add_time_entries_bulk([
+        {'activity_id': activity_id, 'hours': 1.0, 'date': now - timedelta(minutes=i), 'notes': 'x' * 100}
+        for i in range(20000)
+    ])
+    reclaim_space()
+    full_size = os.path.getsize(os.environ['TRACKER_DB_PATH'])
+    
+    crud.clear_time_entries()
+    reclaim_space()
+    
+    with get_engine().connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+    assert os.path.getsize(os.environ['TRACKER_DB_PATH']) < full_size / 10
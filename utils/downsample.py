@@ -0,0 +1,41 @@
+import numpy as np
+
+def lttb_indices(x, y, max_points):
+    """Pick the indices of at most ``max_points`` points that keep a series' shape.
+    
+    Largest-Triangle-Three-Buckets: the first and last points are kept, the
+    rest are split into equal buckets and from each bucket the point forming
+    the largest triangle with the previously kept point and the average of the
+    next bucket is kept. ``x`` must be sorted.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    
+    # Bucket boundaries over the points between the first and the last
+    edges = np.floor(np.arange(max_points - 1) * (n - 2) / (max_points - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    
+    # Averages of every bucket, with the last point as the bucket after the last
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    avg_x = np.r_[avg_x[1:], x[-1]]
+    avg_y = np.r_[avg_y[1:], y[-1]]
+    
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[previous] - avg_x[bucket]) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (avg_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    
+    return selected
@@ -0,0 +1,42 @@
+from typing import NamedTuple
+import pandas as pd
+from utils.streaks import streak_series
+
+class SeriesBundle(NamedTuple):
+    """Aggregated series shared by the Statistics charts and metrics.
+    
+    Built once per filter selection; treat the frames as read-only.
+    """
+    daily: pd.DataFrame        # date, hours, sessions (one row per active day)
+    weekly: pd.DataFrame       # week_start, hours, sessions
+    cumulative: pd.DataFrame   # date, hours (running total)
+    by_activity: pd.DataFrame  # activity_name, hours, sessions
+    by_hour: pd.DataFrame      # hour, hours
+    streaks: pd.DataFrame      # date, streak (every day up to the end date)
+
+def build_series(daily_df, hourly_df, end_date=None):
+    """Build every aggregate from per-activity daily rows and hour-of-day sums.
+    
+    ``daily_df`` has ``activity_name``, ``date``, ``hours`` and ``sessions``
+    columns (see ``get_daily_hours_df``); ``hourly_df`` has ``hour`` and
+    ``hours``. Each aggregate is derived from the smallest series above it, so
+    the raw rows are only grouped once. Streaks run up to ``end_date``
+    (default today).
+    """
+    daily = daily_df.groupby('date', as_index=False, sort=True)[['hours', 'sessions']].sum()
+    
+    week_start = daily['date'] - pd.to_timedelta(daily['date'].dt.dayofweek, unit='D')
+    weekly = daily.groupby(week_start.rename('week_start'))[['hours', 'sessions']].sum().reset_index()
+    
+    cumulative = pd.DataFrame({'date': daily['date'], 'hours': daily['hours'].cumsum()})
+    
+    by_activity = daily_df.groupby('activity_name', as_index=False, observed=True)[['hours', 'sessions']].sum()
+    
+    return SeriesBundle(
+        daily=daily,
+        weekly=weekly,
+        cumulative=cumulative,
+        by_activity=by_activity,
+        by_hour=hourly_df.sort_values('hour', ignore_index=True),
+        streaks=streak_series(daily.loc[daily['hours'] > 0, 'date'], today=end_date)['series']
+    )
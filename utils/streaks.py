@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+def to_day_numbers(days):
+    """Convert dates (date objects, strings or datetimes) to integer day numbers."""
+    values = pd.to_datetime(pd.Series(days, dtype=object), format='mixed')
+    return values.values.astype('datetime64[D]').astype(np.int64)
+
+def _today_number(today=None):
+    """Get the day number for today (or the given date)."""
+    if today is None:
+        today = datetime.now().date()
+    return int(np.datetime64(today, 'D').astype(np.int64))
+
+def find_runs(keys, day_numbers):
+    """Split active days into runs of consecutive days (gaps-and-islands).
+
+    Returns the sorted, de-duplicated keys and day numbers together with the run
+    id of every day. A new run starts whenever the key changes or a day is
+    missing, so the cost is a single sort plus a few vectorized passes.
+    """
+    keys = np.asarray(keys)
+    days = np.asarray(day_numbers, dtype=np.int64)
+    if days.size == 0:
+        return keys[:0], days, np.zeros(0, dtype=np.int64)
+
+    order = np.lexsort((days, keys))
+    keys = keys[order]
+    days = days[order]
+
+    # Drop duplicate (key, day) pairs
+    unique = np.ones(days.size, dtype=bool)
+    unique[1:] = (keys[1:] != keys[:-1]) | (days[1:] != days[:-1])
+    keys = keys[unique]
+    days = days[unique]
+
+    new_run = np.ones(days.size, dtype=bool)
+    new_run[1:] = (keys[1:] != keys[:-1]) | (np.diff(days) != 1)
+    run_ids = np.cumsum(new_run) - 1
+
+    return keys, days, run_ids
+
+def _run_bounds(run_ids):
+    """Get the index of the first and last day of every run."""
+    run_starts = np.flatnonzero(np.r_[True, run_ids[1:] != run_ids[:-1]])
+    run_ends = np.r_[run_starts[1:] - 1, run_ids.size - 1]
+    return run_starts, run_ends
+
+def _streaks_from_runs(keys, day_numbers, run_ids, today=None, grace_days=0):
+    """Get current and longest streaks per key from the output of ``find_runs``."""
+    if day_numbers.size == 0:
+        return {}
+
+    run_lengths = np.bincount(run_ids)
+    run_starts, run_ends = _run_bounds(run_ids)
+    run_keys = keys[run_starts]
+
+    # Runs are ordered by key, so each key owns a contiguous block of runs
+    key_starts = np.flatnonzero(np.r_[True, run_keys[1:] != run_keys[:-1]])
+    key_lasts = np.r_[key_starts[1:] - 1, run_keys.size - 1]
+    longest = np.maximum.reduceat(run_lengths, key_starts)
+
+    days_since = _today_number(today) - day_numbers[run_ends[key_lasts]]
+    current = np.where(
+        (days_since >= 0) & (days_since <= grace_days),
+        run_lengths[key_lasts],
+        0
+    )
+
+    return {
+        key.item() if hasattr(key, 'item') else key: {'current': int(cur), 'longest': int(best)}
+        for key, cur, best in zip(run_keys[key_starts], current, longest)
+    }
+
+def compute_streaks(keys, days, today=None, grace_days=0):
+    """Compute current and longest streaks for every key in one pass.
+
+    ``keys`` and ``days`` are parallel sequences of active (key, day) pairs, e.g.
+    the distinct days on which each activity has entries. A run counts as the
+    current streak if its last day is at most ``grace_days`` before today.
+    Returns a dict mapping each key to ``{'current': int, 'longest': int}``.
+    """
+    return _streaks_from_runs(*find_runs(keys, to_day_numbers(days)), today, grace_days)
+
+def streak_series(days, today=None, grace_days=0):
+    """Compute the streak on every day, plus the current and longest streak.
+    
+    Uses the same runs as ``compute_streaks``: the streak on an active day is
+    its position in its run, and it is 0 on every missing day of a continuous
+    day range ending today. Returns ``{'current': int, 'longest': int,
+    'series': DataFrame}`` where the series has ``date`` and ``streak``
+    columns.
+    """
+    day_numbers = to_day_numbers(days)
+    keys, day_numbers, run_ids = find_runs(np.zeros(day_numbers.size, dtype=np.int64), day_numbers)
+    if day_numbers.size == 0:
+        return {
+            'current': 0,
+            'longest': 0,
+            'series': pd.DataFrame({'date': pd.to_datetime([]), 'streak': np.zeros(0, dtype=np.int64)})
+        }
+    
+    run_starts, _ = _run_bounds(run_ids)
+    first_day = day_numbers[0]
+    streak = np.zeros(max(day_numbers[-1], _today_number(today)) - first_day + 1, dtype=np.int64)
+    streak[day_numbers - first_day] = np.arange(day_numbers.size) - run_starts[run_ids] + 1
+    
+    return {
+        **_streaks_from_runs(keys, day_numbers, run_ids, today, grace_days)[0],
+        'series': pd.DataFrame({
+            'date': pd.to_datetime(np.arange(first_day, first_day + streak.size).astype('datetime64[D]')),
+            'streak': streak
+        })
+    }
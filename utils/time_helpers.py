@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 import pandas as pd
+from utils.streaks import streak_series
 
 def format_duration(hours):
     """Format hours as human-readable duration."""
@@ -16,6 +17,12 @@ def format_duration(hours):
         else:
             return f"{days} day{'s' if days != 1 else ''} {remaining_hours:.1f} hours"
 
+def start_of_day(day):
+    """Get midnight at the start of the given date or datetime."""
+    if isinstance(day, datetime):
+        day = day.date()
+    return datetime.combine(day, datetime.min.time())
+
 def calculate_daily_average(total_hours, start_date):
     """Calculate daily average hours since start date."""
     if not start_date:
@@ -85,34 +92,9 @@ def calculate_streak(df):
     if df.empty:
         return 0
     
-    # Group by date and sum hours
-    daily_hours = df.groupby('date')['hours'].sum().reset_index()
-    daily_hours = daily_hours.sort_values('date', ascending=False)
-    
-    streak = 0
-    current_date = datetime.now().date()
-    
-    for _, row in daily_hours.iterrows():
-        # Convert pandas datetime to date for comparison
-        row_date = pd.to_datetime(row['date']).date()
-        
-        if row_date == current_date and row['hours'] > 0:
-            streak += 1
-            current_date -= timedelta(days=1)
-        elif row_date == current_date and row['hours'] == 0:
-            break
-        elif row_date < current_date:
-            # Check if there are any missing days
-            days_gap = (current_date - row_date).days
-            if days_gap > 1:
-                break
-            elif row['hours'] > 0:
-                streak += 1
-                current_date = row_date - timedelta(days=1)
-            else:
-                break
-    
-    return streak
+    # A streak that ended yesterday is still current until today is over
+    active_days = df.loc[df['hours'] > 0, 'date']
+    return streak_series(active_days, grace_days=1)['current']
 
 def get_week_dates(date):
     """Get start and end dates of the week containing the given date."""
@@ -204,8 +186,9 @@ def get_productivity_score(total_hours, target_hours=10000):
     else:
         return progress / 25 * 40
 
-def calculate_velocity(df, days=7):
+def calculate_velocity(series, days=7):
     """Calculate velocity (hours per day) over the last N days."""
+    df = series.daily
     if df.empty:
         return 0
     
@@ -220,12 +203,12 @@ def calculate_velocity(df, days=7):
     total_hours = recent_data['hours'].sum()
     return total_hours / days
 
-def get_best_day_stats(df):
+def get_best_day_stats(series):
     """Get statistics for the best day."""
-    if df.empty:
+    daily_hours = series.daily
+    if daily_hours.empty:
         return None
     
-    daily_hours = df.groupby('date')['hours'].sum().reset_index()
     best_day = daily_hours.loc[daily_hours['hours'].idxmax()]
     
     # Convert pandas datetime to datetime for formatting
@@ -237,8 +220,9 @@ def get_best_day_stats(df):
         'formatted_date': best_date.strftime('%B %d, %Y')
     }
 
-def get_consistency_score(df, days=30):
+def get_consistency_score(series, days=30):
     """Calculate consistency score based on regular activity."""
+    df = series.daily
     if df.empty:
         return 0
     
@@ -250,8 +234,7 @@ def get_consistency_score(df, days=30):
     if recent_data.empty:
         return 0
     
-    daily_hours = recent_data.groupby('date')['hours'].sum().reset_index()
-    active_days = len(daily_hours[daily_hours['hours'] > 0])
+    active_days = int((recent_data['hours'] > 0).sum())
     
     consistency = (active_days / days) * 100
     return min(consistency, 100)  # Cap at 100% 
\ No newline at end of file